@@ -0,0 +1,166 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from ingestao_nfe import ler_documentos, lotes_de_conteudo
+
+logger = logging.getLogger("FLV_Enterprise")
+
+CAMINHO_ARMAZEM = os.path.join(".cache", "notas_fiscais.sqlite")
+FUSO_BR = timezone(timedelta(hours=-3))
+TAMANHO_LOTE_SQL = 500
+ARQUIVOS_POR_BLOCO = 2000
+BYTES_POR_BLOCO = 64 * 1024 * 1024
+DIAS_RETENCAO = 30
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS notas (
+    chave TEXT PRIMARY KEY, data_recebimento TEXT NOT NULL, arquivo TEXT,
+    emit_nome TEXT, emit_cnpj TEXT, dest_cnpj TEXT, dest_nome TEXT, infcpl TEXT, recebida_em TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_notas_data ON notas (data_recebimento);
+CREATE TABLE IF NOT EXISTS itens (chave TEXT NOT NULL, seq INTEGER NOT NULL, x_prod TEXT, c_prod TEXT, q_com TEXT, PRIMARY KEY (chave, seq));
+CREATE TABLE IF NOT EXISTS arquivos (hash TEXT PRIMARY KEY, chave TEXT, visto_em TEXT);
+"""
+
+def hoje():
+    return datetime.now(FUSO_BR).date().isoformat()
+
+def chave_acesso(cabecalho, dados):
+    # Id="NFe<44 dígitos>"; sem Id (XML fora do padrão), o próprio conteúdo identifica a nota
+    chave = (cabecalho.get("chave") or "").removeprefix("NFe").strip()
+    return chave or "SHA256:" + hashlib.sha256(dados).hexdigest()
+
+# ==========================================
+# ARMAZÉM LOCAL DE NF-e (SQLite)
+# ==========================================
+class ArmazemNFe:
+    """NF-e já parseadas, uma vez por chave de acesso, com os campos brutos (antes de De-Para e cadastros).
+
+    Guardar o bruto mantém as notas válidas quando o De-Para muda: a resolução é refeita na leitura.
+    """
+    def __init__(self, caminho=CAMINHO_ARMAZEM):
+        self.caminho = caminho
+        self._lock = threading.Lock()
+        self._ultima_purga = None
+        os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+        with self._conectar() as conn: conn.executescript(_ESQUEMA)
+
+    @contextmanager
+    def _conectar(self):
+        # "with conn" só faz commit/rollback; a conexão é fechada aqui
+        conn = sqlite3.connect(self.caminho, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn: yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _em_lotes(valores):
+        for inicio in range(0, len(valores), TAMANHO_LOTE_SQL): yield valores[inicio:inicio + TAMANHO_LOTE_SQL]
+
+    def _existentes(self, conn, tabela, coluna, valores):
+        encontrados = set()
+        for lote in self._em_lotes(list(valores)):
+            marcadores = ",".join("?" * len(lote))
+            encontrados.update(v for (v,) in conn.execute(f"SELECT {coluna} FROM {tabela} WHERE {coluna} IN ({marcadores})", lote))
+        return encontrados
+
+    def registrar(self, arquivos_xml, data_recebimento=None, max_workers=None):
+        """Parseia só os XMLs inéditos (avulsos ou dentro de ZIPs) e grava as notas cuja chave ainda não existe.
+
+        Retorna {"novas", "duplicadas", "ja_vistos", "invalidos"}: arquivos idênticos a um já recebido nem são parseados.
+        """
+        data_recebimento = data_recebimento or hoje()
+        resumo = {"novas": 0, "duplicadas": 0, "ja_vistos": 0, "invalidos": 0}
+        hashes_ineditos = set()
+
+        with self._lock, self._conectar() as conn:
+            # Blocos limitados: um ZIP grande não é descompactado inteiro em memória
+            for bloco in lotes_de_conteudo(arquivos_xml, ARQUIVOS_POR_BLOCO, BYTES_POR_BLOCO):
+                self._registrar_bloco(conn, bloco, data_recebimento, max_workers, resumo, hashes_ineditos)
+
+        if resumo["duplicadas"]: logger.info(f"{resumo['duplicadas']} NF-e já recebidas (mesma chave de acesso) ignoradas.")
+        return resumo
+
+    def _registrar_bloco(self, conn, bloco, data_recebimento, max_workers, resumo, hashes_ineditos):
+        hashes = [hashlib.sha256(dados).hexdigest() for _, dados in bloco]
+        vistos = self._existentes(conn, "arquivos", "hash", set(hashes))
+        ineditos = []
+        for (nome, dados), hash_arquivo in zip(bloco, hashes):
+            if hash_arquivo in vistos or hash_arquivo in hashes_ineditos:
+                resumo["ja_vistos"] += 1
+                continue
+            hashes_ineditos.add(hash_arquivo)
+            ineditos.append((nome, dados, hash_arquivo))
+
+        documentos = ler_documentos([(nome, dados) for nome, dados, _ in ineditos], max_workers)
+        chaves = [None if doc is None else chave_acesso(doc[1], dados) for doc, (_, dados, _) in zip(documentos, ineditos)]
+        gravadas = self._existentes(conn, "notas", "chave", {c for c in chaves if c is not None})
+
+        agora = datetime.now(FUSO_BR).isoformat(timespec="seconds")
+        notas, itens_sql = [], []
+        for documento, chave in zip(documentos, chaves):
+            if documento is None:
+                resumo["invalidos"] += 1
+                continue
+            if chave in gravadas:
+                resumo["duplicadas"] += 1
+                continue
+            gravadas.add(chave)
+            nome, cabecalho, itens = documento
+            notas.append((chave, data_recebimento, nome, cabecalho["emit_nome"], cabecalho["emit_cnpj"],
+                          cabecalho["dest_cnpj"], cabecalho["dest_nome"], cabecalho["infcpl"], agora))
+            itens_sql.extend((chave, seq, x_prod, c_prod, q_com) for seq, (x_prod, c_prod, q_com) in enumerate(itens))
+        resumo["novas"] += len(notas)
+
+        conn.executemany("INSERT INTO notas VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", notas)
+        conn.executemany("INSERT INTO itens VALUES (?, ?, ?, ?, ?)", itens_sql)
+        # Inválidos também ficam registrados: reenviar o mesmo arquivo corrompido não custa outro parse
+        conn.executemany("INSERT INTO arquivos VALUES (?, ?, ?)", [(h, c, agora) for (_, _, h), c in zip(ineditos, chaves)])
+
+    def documentos_do_dia(self, data_recebimento=None):
+        """[(arquivo, cabecalho, itens)] na ordem de recebimento, no formato de ingestao_nfe.ler_documentos."""
+        data_recebimento = data_recebimento or hoje()
+        with self._conectar() as conn:
+            notas = conn.execute("SELECT chave, arquivo, emit_nome, emit_cnpj, dest_cnpj, dest_nome, infcpl FROM notas "
+                                 "WHERE data_recebimento = ? ORDER BY rowid", (data_recebimento,)).fetchall()
+            itens_por_chave = {}
+            for chave, x_prod, c_prod, q_com in conn.execute(
+                    "SELECT i.chave, i.x_prod, i.c_prod, i.q_com FROM itens i JOIN notas n ON n.chave = i.chave "
+                    "WHERE n.data_recebimento = ? ORDER BY i.chave, i.seq", (data_recebimento,)):
+                itens_por_chave.setdefault(chave, []).append((x_prod, c_prod, q_com))
+
+        return [(arquivo, {"chave": chave, "emit_nome": emit_nome, "emit_cnpj": emit_cnpj, "dest_cnpj": dest_cnpj, "dest_nome": dest_nome, "infcpl": infcpl},
+                 itens_por_chave.get(chave, []))
+                for chave, arquivo, emit_nome, emit_cnpj, dest_cnpj, dest_nome, infcpl in notas]
+
+    def versao(self, data_recebimento=None):
+        # Só cresce (notas não são alteradas): (quantidade, último rowid) identifica o conteúdo do dia
+        with self._conectar() as conn:
+            return tuple(conn.execute("SELECT count(*), coalesce(max(rowid), 0) FROM notas WHERE data_recebimento = ?",
+                                      (data_recebimento or hoje(),)).fetchone())
+
+    def purgar(self, dias_retencao=DIAS_RETENCAO):
+        """Remove notas recebidas há mais de dias_retencao dias (e seus itens e hashes). Roda no máximo uma vez por dia."""
+        if self._ultima_purga == (hoje(), dias_retencao): return 0
+        self._ultima_purga = (hoje(), dias_retencao)
+        limite = (datetime.now(FUSO_BR).date() - timedelta(days=dias_retencao)).isoformat()
+        with self._lock, self._conectar() as conn:
+            conn.execute("DELETE FROM itens WHERE chave IN (SELECT chave FROM notas WHERE data_recebimento < ?)", (limite,))
+            conn.execute("DELETE FROM arquivos WHERE visto_em < ? OR chave IN (SELECT chave FROM notas WHERE data_recebimento < ?)", (limite, limite))
+            removidas = conn.execute("DELETE FROM notas WHERE data_recebimento < ?", (limite,)).rowcount
+        if removidas: logger.info(f"Armazém de NF-e: {removidas} notas com mais de {dias_retencao} dias removidas.")
+        return removidas
+
+_ARMAZEM_PADRAO = None
+
+def armazem_padrao(caminho=CAMINHO_ARMAZEM):
+    global _ARMAZEM_PADRAO
+    if _ARMAZEM_PADRAO is None or _ARMAZEM_PADRAO.caminho != caminho: _ARMAZEM_PADRAO = ArmazemNFe(caminho)
+    return _ARMAZEM_PADRAO
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("FLV_Enterprise")
+
+CAMINHO_CACHE_IA = os.path.join(".cache", "justificativas_ia.json")
+
+# ==========================================
+# CACHE E LIMITADOR
+# ==========================================
+class CacheIA:
+    """Memo (produto, falta, hash do infCpl) -> (justificado, texto), persistido em JSON entre reruns."""
+    def __init__(self, caminho=CAMINHO_CACHE_IA):
+        self.caminho = caminho
+        self._dados = {}
+        self._lock = threading.Lock()
+        if caminho and os.path.exists(caminho):
+            try:
+                with open(caminho, encoding="utf-8") as f: self._dados = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Cache de IA ilegível, recomeçando do zero: {e}")
+
+    @staticmethod
+    def chave(produto, diferenca, texto_infcpl):
+        hash_infcpl = hashlib.sha256(texto_infcpl.encode("utf-8")).hexdigest()[:16]
+        return f"{produto}|{abs(diferenca):.3f}|{hash_infcpl}"
+
+    def obter(self, chave):
+        valor = self._dados.get(chave)
+        return tuple(valor) if valor is not None else None
+
+    def gravar(self, chave, resultado):
+        with self._lock: self._dados[chave] = list(resultado)
+
+    def persistir(self):
+        if not self.caminho: return
+        with self._lock: conteudo = json.dumps(self._dados, ensure_ascii=False)
+        try:
+            os.makedirs(os.path.dirname(self.caminho) or ".", exist_ok=True)
+            temporario = f"{self.caminho}.tmp"
+            with open(temporario, "w", encoding="utf-8") as f: f.write(conteudo)
+            os.replace(temporario, self.caminho)
+        except OSError as e:
+            logger.warning(f"Não foi possível persistir o cache de IA: {e}")
+
+_CACHE_PADRAO = None
+
+def cache_padrao():
+    # Instância única por processo: sobrevive aos reruns do Streamlit sem reler o disco
+    global _CACHE_PADRAO
+    if _CACHE_PADRAO is None: _CACHE_PADRAO = CacheIA()
+    return _CACHE_PADRAO
+
+class LimitadorTaxa:
+    def __init__(self, requisicoes_por_segundo):
+        self.intervalo = 1.0 / requisicoes_por_segundo if requisicoes_por_segundo else 0.0
+        self._proxima = 0.0
+        self._lock = threading.Lock()
+
+    def aguardar(self):
+        if not self.intervalo: return
+        with self._lock:
+            agora = time.monotonic()
+            espera = self._proxima - agora
+            self._proxima = max(agora, self._proxima) + self.intervalo
+        if espera > 0: time.sleep(espera)
+
+# ==========================================
+# AUDITOR IA EM LOTE
+# ==========================================
+class AuditorIA:
+    def __init__(self, model, max_concorrencia=8, requisicoes_por_segundo=4.0, timeout=20.0, cache=None):
+        self.model = model
+        self.max_concorrencia = max_concorrencia
+        self.timeout = timeout
+        self.limitador = LimitadorTaxa(requisicoes_por_segundo)
+        self.cache = cache if cache is not None else cache_padrao()
+        # Métricas da execução: latência por chamada ao modelo, acertos de cache e falhas
+        self.latencias, self.acertos_cache, self.falhas = [], 0, 0
+
+    def elegivel(self, texto_infcpl):
+        return bool(self.model and texto_infcpl and len(texto_infcpl.strip()) >= 5)
+
+    def _consultar(self, produto, diferenca_negativa, texto_infcpl):
+        try:
+            prompt = f"Houve FALTA de {abs(diferenca_negativa)} de '{produto}'. O fornecedor escreveu na nota: '{texto_infcpl}'. Isso justifica a falta? Responda ESTRITAMENTE: [SIM] ou [NAO] - Justificativa em 10 palavras."
+            self.limitador.aguardar()
+            inicio = time.perf_counter()
+            resposta = self.model.generate_content(prompt, request_options={"timeout": self.timeout}).text.strip()
+            self.latencias.append(time.perf_counter() - inicio)
+            return resposta.startswith("[SIM]"), resposta
+        except Exception as e:
+            logger.warning(f"Timeout ou falha na inferência (Produto: {produto}): {e}")
+            return None
+
+    def analisar_lote(self, consultas):
+        """Recebe [(produto, diferenca, infcpl)] e devolve [(justificado, texto)] na mesma ordem.
+
+        Consultas repetidas (mesma chave) geram uma única chamada; falhas não entram no cache.
+        """
+        resultados = [(False, "")] * len(consultas)
+        pendentes = {}
+        for pos, (produto, diferenca, texto) in enumerate(consultas):
+            if not self.elegivel(texto): continue
+            chave = CacheIA.chave(produto, diferenca, texto)
+            em_cache = self.cache.obter(chave)
+            if em_cache is not None:
+                resultados[pos] = em_cache
+                self.acertos_cache += 1
+            else: pendentes.setdefault(chave, (produto, diferenca, texto, []))[3].append(pos)
+
+        if not pendentes: return resultados
+
+        with ThreadPoolExecutor(max_workers=self.max_concorrencia) as pool:
+            futuros = {chave: pool.submit(self._consultar, *dados[:3]) for chave, dados in pendentes.items()}
+            for chave, futuro in futuros.items():
+                resultado = futuro.result()
+                if resultado is None:
+                    resultado = (False, "Erro IA")
+                    self.falhas += 1
+                else: self.cache.gravar(chave, resultado)
+                for pos in pendentes[chave][3]: resultados[pos] = resultado
+
+        self.cache.persistir()
+        return resultados
@@ -0,0 +1,553 @@
+import importlib.util
+import logging
+import os
+import time
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from motor_fuzzy import MotorFuzzy
+from indice_fornecedores import sugerir_alias_fornecedor, COLUNAS_SUGESTOES
+from normalizacao import normalizar_serie, estatisticas_normalizar, ResolvedorFornecedor, ResolvedorLoja
+from ingestao_nfe import extrair_notas, resolver_documentos
+from auditor_ia import AuditorIA
+from cache_entradas import chave_conteudo
+from armazem_nfe import hoje, DIAS_RETENCAO
+from doca import ler_contagens, aplicar_contagem, SEM_CONTAGEM
+from metricas import MetricasExecucao, CAMINHO_PROMETHEUS
+from relatorios import gerar_excel_auditoria
+from historico import gravar_parquet, montar_historico, TABELA_HISTORICO
+
+logger = logging.getLogger("FLV_Enterprise")
+
+# --- LEITOR DE EXCEL (opcional, mais rápido que openpyxl) ---
+try:
+    import python_calamine  # noqa: F401
+    MOTOR_EXCEL = "calamine"
+except ImportError:
+    MOTOR_EXCEL = None
+
+# Fases de processar_cruzamento: tempo acumulado em tempos_fases, registros gerados em registros_fases
+FASES_CRUZAMENTO = ("particionamento", "fase1_exato", "fase2_fuzzy", "fase3_faltas", "fase4_extras", "fase5_fornecedores", "ia")
+
+# Abaixo disso (linhas de pedido agregadas) o custo de subir o pool supera o ganho
+LIMIAR_PARALELO_CRUZAMENTO = 5000
+LOTES_POR_PROCESSO = 4
+
+# --- MOTOR COGNITIVO (SDK importado só quando a IA é usada) ---
+def ia_disponivel():
+    try: return importlib.util.find_spec("google.generativeai") is not None
+    except ModuleNotFoundError: return False
+
+def criar_modelo_ia(config):
+    """Instancia o Gemini a partir da configuração. Retorna (model, config_ia) ou (None, {})."""
+    if "GEMINI_API_KEY" not in config: return None, {}
+    try:
+        import google.generativeai as genai
+        genai.configure(api_key=config["GEMINI_API_KEY"])
+        model = genai.GenerativeModel("gemini-1.5-flash")
+        config_ia = {"max_concorrencia": int(config.get("IA_MAX_CONCORRENCIA", 8)),
+                     "requisicoes_por_segundo": float(config.get("IA_REQUISICOES_POR_SEGUNDO", 4.0)),
+                     "timeout": float(config.get("IA_TIMEOUT", 20.0))}
+    except ImportError:
+        return None, {}
+    except Exception as e:
+        logger.error(f"Falha na alocação do modelo de IA: {e}")
+        return None, {}
+    return model, config_ia
+
+# ==========================================
+# 1. REPOSITORY LAYER
+# ==========================================
+class DatabaseRepository:
+    """Acesso ao Neon/PostgreSQL fora do Streamlit; psycopg2 só é importado na primeira consulta."""
+    def __init__(self, dsn, max_conexoes=None):
+        self.dsn = dsn
+        self.max_conexoes = max_conexoes
+        self._mapeamentos = None
+        self._resolvedores = None
+
+    def _conexao(self):
+        from banco import conexao
+        return conexao(self.dsn, self.max_conexoes)
+
+    def carregar_mapeamentos(self):
+        if self._mapeamentos is None:
+            # Mesma sessão da verificação do De-Para: na carga fria, as três tabelas de referência de uma vez
+            from banco import cache_depara
+            _, self._mapeamentos = cache_depara().obter(self._conexao, com_mapeamentos=True)
+        return self._mapeamentos
+
+    def carregar_dicionario_depara(self):
+        from banco import cache_depara
+        return cache_depara().obter(self._conexao)
+
+    def versao_depara(self):
+        from banco import cache_depara
+        return cache_depara().versao
+
+    def gravar_historico(self, tabelas):
+        from banco import gravar_historico
+        with self._conexao() as conn: return gravar_historico(conn, tabelas)
+
+    def carregar_resolvedores(self):
+        if self._resolvedores is None:
+            mapping_forn, mapping_nome, mapping_cnpj = self.carregar_mapeamentos()
+            self._resolvedores = ResolvedorFornecedor(mapping_forn), ResolvedorLoja(mapping_nome, mapping_cnpj)
+        return self._resolvedores
+
+class NFeRepository:
+    def extrair_dados_xml(self, arquivos_xml, dict_depara, resolvedor_forn, resolvedor_loja, max_workers=None, memoria_match=None):
+        # Ingestão streaming (iterparse) em pool de processos; saída colunar
+        colunas, textos_infcpl = extrair_notas(arquivos_xml, dict_depara, resolvedor_forn, resolvedor_loja, max_workers=max_workers, memoria_match=memoria_match)
+        return pd.DataFrame(colunas), textos_infcpl
+
+    def extrair_dados_armazem(self, armazem, data_recebimento, dict_depara, resolvedor_forn, resolvedor_loja, memoria_match=None):
+        # Notas do dia já parseadas e deduplicadas por chave de acesso; só a resolução é refeita
+        colunas, textos_infcpl = resolver_documentos(armazem.documentos_do_dia(data_recebimento), dict_depara, resolvedor_forn, resolvedor_loja, memoria_match)
+        return pd.DataFrame(colunas), textos_infcpl
+
+class PedidoRepository:
+    @staticmethod
+    def _converter_float(serie, valor_na):
+        # float() do Python uma vez por valor distinto; NaN assume valor_na e texto inválido é sinalizado
+        codigos, unicos = pd.factorize(serie)
+        convertidos, invalidos = np.empty(len(unicos) + 1), np.zeros(len(unicos) + 1, dtype=bool)
+        for pos, valor in enumerate(unicos):
+            try: convertidos[pos] = float(valor)
+            except (TypeError, ValueError): convertidos[pos], invalidos[pos] = 0.0, True
+        convertidos[-1] = valor_na
+        return convertidos[codigos], invalidos[codigos]
+
+    def extrair_pedidos_excel(self, arquivo_excel, resolvedor_forn):
+        df_pedidos_raw = pd.read_excel(arquivo_excel, sheet_name=None, header=None, engine=MOTOR_EXCEL)
+        partes = []
+        for aba, df in df_pedidos_raw.items():
+            if df.empty: continue
+            col0 = df[0].map(str).str.strip()
+
+            # Contexto "Fornecedor:" propagado para as linhas de item (forward-fill)
+            eh_fornecedor = col0.str.startswith("Fornecedor:")
+            forn_orig = col0[eh_fornecedor].str.replace("Fornecedor:", "", regex=False).str.strip()
+            forn_macro = forn_orig.map(resolvedor_forn.resolver)
+            forn_orig = forn_orig.reindex(df.index).ffill().fillna("DESCONHECIDO")
+            forn_macro = forn_macro.reindex(df.index).ffill().fillna("DESCONHECIDO")
+
+            eh_item = ~eh_fornecedor & (pd.to_numeric(col0, errors='coerce') > 0)
+            if not eh_item.any(): continue
+            itens = df[eh_item]
+
+            # Conversão caixa -> kg em lote; qualquer campo inválido zera a linha, como antes
+            sem_coluna = (np.zeros(len(itens)), np.ones(len(itens), dtype=bool))
+            qtd_bruta, invalida_qtd = self._converter_float(itens[2], 0.0) if 2 in itens.columns else sem_coluna
+            padrao_cx, invalido_padrao = self._converter_float(itens[3], 1.0) if 3 in itens.columns else sem_coluna
+            qtd_convertida_kg = np.where(invalida_qtd | invalido_padrao, 0.0, qtd_bruta * padrao_cx)
+
+            partes.append(pd.DataFrame({'Loja': aba, 'Fornecedor_Original': forn_orig[eh_item].to_numpy(), 'Fornecedor_Macro': forn_macro[eh_item].to_numpy(),
+                                        'Produto': itens[1].to_numpy(dtype=object), 'Qtd': qtd_convertida_kg}))
+
+        if not partes: return pd.DataFrame()
+        df_pedidos = pd.concat(partes, ignore_index=True)
+        df_pedidos['Produto'] = normalizar_serie(df_pedidos['Produto'])
+        return df_pedidos
+
+# ==========================================
+# 2. SERVICE LAYER
+# ==========================================
+COLUNAS_RESULTADO = ['loja','fornecedor','produto_pedido','produto_xml','qtd_pedido','qtd_nota','origem_match','diferenca','status_visual','status_codigo','justificativa_ia','qtd_fisico','padrao_fisico','status_doca','diferenca_doca']
+COLUNAS_CATEGORICAS = ('loja', 'fornecedor', 'origem_match', 'status_visual', 'status_doca')
+
+class ResultadosCruzamento:
+    """Buffers por coluna (floats e códigos em array tipado); a Doca só entra depois, então suas colunas nascem constantes."""
+    def __init__(self):
+        self.texto = {col: [] for col in ('loja', 'fornecedor', 'produto_pedido', 'produto_xml', 'origem_match', 'status_visual', 'justificativa_ia')}
+        self.numeros = {col: array('d') for col in ('qtd_pedido', 'qtd_nota', 'diferenca')}
+        self.status_codigo = array('b')
+
+    def __len__(self):
+        return len(self.status_codigo)
+
+    def adicionar(self, loja, fornecedor, produto_pedido, produto_xml, qtd_pedido, qtd_nota, origem, diferenca, status_visual, status_codigo):
+        texto, numeros = self.texto, self.numeros
+        texto['loja'].append(loja); texto['fornecedor'].append(fornecedor)
+        texto['produto_pedido'].append(produto_pedido); texto['produto_xml'].append(produto_xml)
+        texto['origem_match'].append(origem); texto['status_visual'].append(status_visual); texto['justificativa_ia'].append("")
+        numeros['qtd_pedido'].append(qtd_pedido); numeros['qtd_nota'].append(qtd_nota); numeros['diferenca'].append(diferenca)
+        self.status_codigo.append(status_codigo)
+
+    def estender(self, outro):
+        for col, valores in outro.texto.items(): self.texto[col].extend(valores)
+        for col, valores in outro.numeros.items(): self.numeros[col].extend(valores)
+        self.status_codigo.extend(outro.status_codigo)
+
+    def justificar(self, pos, status_visual, justificativa):
+        self.texto['status_visual'][pos], self.texto['justificativa_ia'][pos] = status_visual, justificativa
+
+    def para_dataframe(self):
+        n = len(self)
+        colunas = {col: pd.Categorical(valores) if col in COLUNAS_CATEGORICAS else valores for col, valores in self.texto.items()}
+        colunas.update({col: np.array(valores, dtype=np.float64) for col, valores in self.numeros.items()})
+        colunas['status_codigo'] = np.array(self.status_codigo, dtype=np.int8)
+        colunas['qtd_fisico'], colunas['padrao_fisico'] = np.full(n, "-", dtype=object), np.full(n, "-", dtype=object)
+        colunas['status_doca'] = pd.Categorical.from_codes(np.zeros(n, dtype=np.int8), [SEM_CONTAGEM])
+        colunas['diferenca_doca'] = np.zeros(n)
+        return pd.DataFrame({col: colunas[col] for col in COLUNAS_RESULTADO})
+
+class AuditoriaService:
+    def __init__(self, usar_ia, fuzzy_threshold, model=None, config=None, max_workers=None):
+        self.usar_ia = usar_ia
+        self.max_workers = max_workers or int((config or {}).get("CRUZAMENTO_PROCESSOS", 0))
+        self.TOLERANCIA_DIF = 0.001
+        self.FUZZY_THRESHOLD = fuzzy_threshold
+        self.model = model if usar_ia else None
+        self.motor_fuzzy = MotorFuzzy(fuzzy_threshold)
+        self.tempos_fases = dict.fromkeys(FASES_CRUZAMENTO, 0.0)
+        self.registros_fases = dict.fromkeys(FASES_CRUZAMENTO, 0)
+        self._marca, self._n_registros = time.perf_counter(), 0
+        self.pares_fuzzy = []
+        self.sugestoes_fornecedor = pd.DataFrame(columns=COLUNAS_SUGESTOES)
+        self.comparacoes_fornecedor = 0
+        config_ia = {}
+        
+        # Otimização: Instância Singleton do motor cognitivo por ciclo
+        if self.usar_ia and self.model is None:
+            self.model, config_ia = criar_modelo_ia(config or {})
+
+        self.auditor_ia = AuditorIA(self.model, **config_ia)
+
+    def _classificar(self, qtd_ped, qtd_fat, tipo):
+        if tipo == "SEM_FORNECEDOR": return ("⚪ SEM NFe P/ FORN", 98, -qtd_ped)
+        if tipo == "SEM_PRODUTO": return ("⚪ PRODUTO NÃO FATURADO", 99, -qtd_ped)
+        diferenca = qtd_fat - qtd_ped
+        if abs(diferenca) < self.TOLERANCIA_DIF: return ("🟢 OK", 0, 0.0)
+        if diferenca < 0: return (f"🔴 NFe FALTA {abs(diferenca):.2f}".replace('.00',''), -1, diferenca)
+        return (f"🟡 NFe SOBRA {diferenca:.2f}".replace('.00',''), 1, diferenca)
+
+    def _registrar_match(self, registros, pendentes_ia, loja, fornecedor, prod_ped, prod_xml, qtd_ped, qtd_xml, origem, infcpl_nota):
+        stat_v, stat_c, dif = self._classificar(qtd_ped, qtd_xml, "OK")
+        # Faltas com infCpl vão para o lote de IA, filtrado e resolvido no processo principal depois do cruzamento
+        if "🔴" in stat_v and infcpl_nota:
+            pendentes_ia.append((len(registros), prod_ped, dif, infcpl_nota))
+        registros.adicionar(loja, fornecedor, prod_ped, prod_xml, qtd_ped, qtd_xml, origem, dif, stat_v, stat_c)
+
+    def _resolver_ia(self, registros, pendentes_ia):
+        if not pendentes_ia: return
+        respostas = self.auditor_ia.analisar_lote([(produto, dif, texto) for _, produto, dif, texto in pendentes_ia])
+        for (pos, _, dif, _), (justificado, just_texto) in zip(pendentes_ia, respostas):
+            if justificado: registros.justificar(pos, f"🤖 JUSTIFICADO (Faltou {abs(dif):.0f})", just_texto)
+
+    def _registrar_extras(self, registros, loja, fornecedor, notas_extra):
+        for prod_xml, qtd_fat, origem_m in zip(notas_extra['Produto'], notas_extra['Qtd'], notas_extra['Origem']):
+            stat_v = f"🟡 NFe EXTRA {qtd_fat:.2f}".replace('.00','')
+            registros.adicionar(loja, fornecedor, "❌ NÃO PEDIDO", prod_xml, 0.0, qtd_fat, origem_m, qtd_fat, stat_v, 2)
+
+    def _fechar_fase(self, fase, registros):
+        # Cronômetro por fase, acumulado entre grupos; contagem = registros gerados desde a última marca
+        agora = time.perf_counter()
+        self.tempos_fases[fase] += agora - self._marca
+        self.registros_fases[fase] += len(registros) - self._n_registros
+        self._marca, self._n_registros = agora, len(registros)
+
+    def _cruzar_grupos(self, grupos, registros, pendentes_ia):
+        """Fases 1 a 4 para cada (loja, fornecedor_macro, pedidos, notas, infcpl); sem estado entre grupos."""
+        for loja, forn_macro, df_ped_group, notas_forn, infcpl_nota in grupos:
+            if notas_forn.empty:
+                for fornecedor, produto, qtd in zip(df_ped_group['Fornecedor_Original'], df_ped_group['Produto'], df_ped_group['Qtd'].tolist()):
+                    stat_v, stat_c, dif = self._classificar(qtd, 0, "SEM_FORNECEDOR")
+                    registros.adicionar(loja, fornecedor, produto, "❌ NÃO ENCONTRADA", qtd, 0.0, "-", dif, stat_v, stat_c)
+                self._fechar_fase("fase3_faltas", registros)
+                continue
+
+            # Colunas lidas uma vez por grupo: as fases trabalham com posições e valores simples, sem Series por par
+            forn_ped, prod_ped, qtd_ped = df_ped_group['Fornecedor_Original'].tolist(), df_ped_group['Produto'].tolist(), df_ped_group['Qtd'].tolist()
+            prod_xml, qtd_xml, origem_xml = notas_forn['Produto'].tolist(), notas_forn['Qtd'].tolist(), notas_forn['Origem'].tolist()
+            matched_ped, matched_xml = set(), set()
+
+            # FASE 1: O(1) Match Perfeito ou De-Para (índice por Produto, primeira nota livre vence)
+            indice_xml = {}
+            for j, produto in enumerate(prod_xml):
+                indice_xml.setdefault(produto, deque()).append(j)
+
+            for i, produto in enumerate(prod_ped):
+                fila = indice_xml.get(produto)
+                if not fila: continue
+                j = fila.popleft()
+                matched_ped.add(i); matched_xml.add(j)
+                self._registrar_match(registros, pendentes_ia, loja, forn_ped[i], produto, prod_xml[j], qtd_ped[i], qtd_xml[j], origem_xml[j], infcpl_nota)
+
+            self._fechar_fase("fase1_exato", registros)
+
+            # FASE 2: Match Fuzzy Vetorizado (matriz Pedido x NFe em lote)
+            pend_ped = [i for i in range(len(prod_ped)) if i not in matched_ped]
+            pend_xml = [j for j in range(len(prod_xml)) if j not in matched_xml]
+            pares = self.motor_fuzzy.parear([prod_ped[i] for i in pend_ped], [prod_xml[j] for j in pend_xml])
+
+            for score, a, b in pares:
+                i, j = pend_ped[a], pend_xml[b]
+                matched_ped.add(i); matched_xml.add(j)
+                self._registrar_match(registros, pendentes_ia, loja, forn_ped[i], prod_ped[i], prod_xml[j], qtd_ped[i], qtd_xml[j], origem_xml[j], infcpl_nota)
+                # Par com quantidade batendo: candidato à memória de matches
+                if registros.status_codigo[-1] == 0: self.pares_fuzzy.append((loja, forn_macro, prod_xml[j], prod_ped[i], score))
+
+            self._fechar_fase("fase2_fuzzy", registros)
+
+            # FASE 3: Resíduos (Faltas reais)
+            for i in range(len(prod_ped)):
+                if i not in matched_ped:
+                    stat_v, stat_c, dif = self._classificar(qtd_ped[i], 0, "SEM_PRODUTO")
+                    registros.adicionar(loja, forn_ped[i], prod_ped[i], "❌ NÃO ENCONTRADA", qtd_ped[i], 0.0, "-", dif, stat_v, stat_c)
+
+            self._fechar_fase("fase3_faltas", registros)
+
+            # FASE 4: Resíduos (Sobra/Não Pedido na NFe)
+            self._registrar_extras(registros, loja, "N/A (extra na nota)", notas_forn.iloc[[j for j in range(len(prod_xml)) if j not in matched_xml]])
+            self._fechar_fase("fase4_extras", registros)
+
+    def _sugerir_fornecedores(self, df_pedidos, registros, notas_sem_pedido):
+        """Pedidos sem nota (98/99) x notas sem pedido da mesma loja, entre fornecedores: sugere aliases de fornecedor.
+
+        Só as sobras entram no índice, então o custo acompanha o tamanho delas e não o do cruzamento.
+        """
+        if not notas_sem_pedido: return 0
+        codigos = np.frombuffer(registros.status_codigo, dtype=np.int8)
+        macro_por_original = dict(zip(df_pedidos['Fornecedor_Original'], df_pedidos['Fornecedor_Macro']))
+        texto = registros.texto
+        sobras_pedido = [(texto['loja'][pos], texto['fornecedor'][pos], macro_por_original[texto['fornecedor'][pos]], texto['produto_pedido'][pos])
+                         for pos in np.flatnonzero(np.isin(codigos, (98, 99)))]
+        sobras_nota = [(loja, forn_macro, produto) for (loja, forn_macro), notas_forn in sorted(notas_sem_pedido.items(), key=lambda item: item[0])
+                       for produto in notas_forn['Produto']]
+        self.sugestoes_fornecedor, repareados, self.comparacoes_fornecedor = sugerir_alias_fornecedor(sobras_pedido, sobras_nota, self.FUZZY_THRESHOLD)
+        return repareados
+
+    def _processos(self, n_pedidos, n_grupos):
+        if n_pedidos < LIMIAR_PARALELO_CRUZAMENTO or n_grupos < 2: return 1
+        return min(self.max_workers or os.cpu_count() or 1, n_grupos)
+
+    def _cruzar_em_paralelo(self, grupos, registros, pendentes_ia, processos):
+        # Lotes contíguos na ordem dos grupos: concatenar na ordem do map() reproduz a saída serial
+        lotes = _dividir_por_custo(grupos, processos * LOTES_POR_PROCESSO)
+        with ProcessPoolExecutor(max_workers=processos) as pool:
+            tarefas = [(self.FUZZY_THRESHOLD, self.TOLERANCIA_DIF, lote) for lote in lotes]
+            for regs_lote, pend_lote, pares_lote, tempos, contagens, comparacoes in pool.map(_cruzar_lote, tarefas):
+                deslocamento = len(registros)
+                registros.estender(regs_lote)
+                pendentes_ia.extend((pos + deslocamento, *resto) for pos, *resto in pend_lote)
+                self.pares_fuzzy.extend(pares_lote)
+                # Tempo das fases = soma da CPU dos processos; o total de parede fica na etapa "cruzamento"
+                for fase in FASES_CRUZAMENTO:
+                    self.tempos_fases[fase] += tempos[fase]
+                    self.registros_fases[fase] += contagens[fase]
+                self.motor_fuzzy.comparacoes += comparacoes
+        self._marca, self._n_registros = time.perf_counter(), len(registros)
+
+    def processar_cruzamento(self, df_pedidos, df_notas, textos_infcpl):
+        if df_pedidos.empty: return pd.DataFrame()
+        self.tempos_fases = dict.fromkeys(FASES_CRUZAMENTO, 0.0)
+        self.registros_fases = dict.fromkeys(FASES_CRUZAMENTO, 0)
+        self._marca, self._n_registros = time.perf_counter(), 0
+        self.pares_fuzzy = []
+        self.sugestoes_fornecedor, self.comparacoes_fornecedor = pd.DataFrame(columns=COLUNAS_SUGESTOES), 0
+        registros, pendentes_ia = ResultadosCruzamento(), []
+
+        df_pedidos = df_pedidos.groupby(['Loja', 'Fornecedor_Original', 'Fornecedor_Macro', 'Produto'], as_index=False)['Qtd'].sum()
+        df_notas_agg = df_notas.groupby(['Loja', 'Fornecedor_Macro', 'Produto', 'Origem'], as_index=False)['Qtd'].sum() if not df_notas.empty else pd.DataFrame()
+
+        # Índice particionado: um único groupby, lookup O(1) por (Loja, Fornecedor_Macro)
+        notas_por_grupo = dict(tuple(df_notas_agg.groupby(['Loja', 'Fornecedor_Macro'], sort=False))) if not df_notas_agg.empty else {}
+        # Só lojas do arquivo de pedidos: no modo armazém as notas cobrem toda loja que recebeu mercadoria no dia
+        lojas_pedido = set(df_pedidos['Loja'])
+        notas_por_grupo = {chave: notas for chave, notas in notas_por_grupo.items() if chave[0] in lojas_pedido}
+        grupos = [(loja, forn_macro, df_ped_group, notas_por_grupo.pop((loja, forn_macro), pd.DataFrame()), textos_infcpl.get((loja, forn_macro), ""))
+                  for (loja, forn_macro), df_ped_group in df_pedidos.groupby(['Loja', 'Fornecedor_Macro'])]
+
+        self._fechar_fase("particionamento", registros)
+        processos = self._processos(len(df_pedidos), len(grupos))
+        if processos > 1: self._cruzar_em_paralelo(grupos, registros, pendentes_ia, processos)
+        else: self._cruzar_grupos(grupos, registros, pendentes_ia)
+
+        # FASE 4 (cont.): Fornecedores com NFe mas sem nenhum pedido na loja (sobras do índice)
+        for (loja, forn_macro), notas_forn in sorted(notas_por_grupo.items(), key=lambda item: item[0]):
+            self._registrar_extras(registros, loja, f"{forn_macro} (sem pedido)", notas_forn)
+
+        self._fechar_fase("fase4_extras", registros)
+
+        # FASE 5: Sobras dos dois lados reaproximadas entre fornecedores (só diagnóstico, o resultado não muda)
+        repareados = self._sugerir_fornecedores(df_pedidos, registros, notas_por_grupo)
+        self._fechar_fase("fase5_fornecedores", registros)
+        self.registros_fases["fase5_fornecedores"] = repareados
+
+        # Justificativas de IA em lote, sempre no processo principal: concorrência limitada, rate limit e memo em disco
+        pendentes_ia = [pendente for pendente in pendentes_ia if self.auditor_ia.elegivel(pendente[3])]
+        self._resolver_ia(registros, pendentes_ia)
+        self._fechar_fase("ia", registros)
+        self.registros_fases["ia"] = len(pendentes_ia)
+
+        if not registros: return pd.DataFrame()
+        return registros.para_dataframe()
+
+def _dividir_por_custo(grupos, n_lotes):
+    # Custo do grupo ~ matriz do fuzzy (pedidos x notas); lotes contíguos de custo parecido
+    custos = [len(ped) * max(len(notas), 1) for _, _, ped, notas, _ in grupos]
+    alvo = sum(custos) / n_lotes
+    lotes, atual, acumulado = [], [], 0
+    for grupo, custo in zip(grupos, custos):
+        atual.append(grupo)
+        acumulado += custo
+        if acumulado >= alvo:
+            lotes.append(atual)
+            atual, acumulado = [], 0
+    if atual: lotes.append(atual)
+    return lotes
+
+def _cruzar_lote(tarefa):
+    # Executado no processo filho: sem modelo de IA nem clientes de rede, só as fases 1 a 4
+    fuzzy_threshold, tolerancia, grupos = tarefa
+    service = AuditoriaService(False, fuzzy_threshold)
+    service.TOLERANCIA_DIF = tolerancia
+    service.motor_fuzzy.workers = 1  # o paralelismo já está nos processos
+    service._marca, service._n_registros = time.perf_counter(), 0
+    registros, pendentes_ia = ResultadosCruzamento(), []
+    service._cruzar_grupos(grupos, registros, pendentes_ia)
+    return registros, pendentes_ia, service.pares_fuzzy, service.tempos_fases, service.registros_fases, service.motor_fuzzy.comparacoes
+
+# ==========================================
+# 3. CONTROLLER
+# ==========================================
+class AuditoriaController:
+    """Orquestra a auditoria. db_repo e config são injetados (Streamlit ou CLI); sem db_repo, usa config["DATABASE_URL"].
+
+    Com cache_entradas (CacheEntradas), pedidos, NF-e e contagens já parseados dos mesmos bytes são reaproveitados.
+    Com armazem_nfe (ArmazemNFe), os XMLs enviados são acumulados por chave de acesso e a auditoria
+    cobre todas as notas recebidas em data_notas (padrão: hoje), sem somar reenvios.
+    Com memoria_match (MemoriaMatch), itens já confirmados por fuzzy em auditorias anteriores chegam resolvidos.
+    """
+    def __init__(self, db_repo=None, config=None, cache_entradas=None, armazem_nfe=None, memoria_match=None):
+        self.config = config if config is not None else {}
+        self.db_repo = db_repo if db_repo is not None else DatabaseRepository(self.config["DATABASE_URL"], self.config.get("DB_POOL_MAX_CONEXOES"))
+        self.cache_entradas = cache_entradas
+        self.armazem_nfe = armazem_nfe
+        self.memoria_match = memoria_match
+        self.metricas = MetricasExecucao()
+        self.sugestoes_fornecedor = pd.DataFrame(columns=COLUNAS_SUGESTOES)
+        self.lojas_auditadas = None
+
+    def _parse_em_cache(self, tipo, arquivos, versao_referencia, parser):
+        if self.cache_entradas is None: return parser()
+        chave = chave_conteudo(tipo, arquivos, versao_referencia)
+        resultado = self.cache_entradas.obter(chave)
+        if resultado is not None:
+            self.metricas.contar("cache_entradas_hits")
+            return resultado
+        self.metricas.contar("cache_entradas_misses")
+        resultado = parser()
+        self.cache_entradas.gravar(chave, resultado)
+        return resultado
+
+    def executar_auditoria(self, arquivo_excel, arquivos_xml, usar_ia, fuzzy_threshold, arquivos_contagem=None, data_notas=None):
+        db_repo = self.db_repo
+        pedido_repo = PedidoRepository()
+        nfe_repo = NFeRepository()
+        metricas = self.metricas = MetricasExecucao()
+        self.data_auditoria = data_notas or hoje()
+        normalizar_antes = estatisticas_normalizar()
+
+        with metricas.etapa("carga_banco"):
+            # Resolvedores primeiro: os cadastros trazem o De-Para na mesma sessão e a chamada seguinte é hit do cache
+            resolvedor_forn, resolvedor_loja = db_repo.carregar_resolvedores()
+            dict_depara = db_repo.carregar_dicionario_depara()
+
+            memoria = self.memoria_match.mapa() if self.memoria_match is not None else None
+
+            # Chave dos parses: conteúdo dos uploads + versão do De-Para + assinatura dos cadastros (+ revisão da memória)
+            versao_referencia = (db_repo.versao_depara(), resolvedor_forn.assinatura, resolvedor_loja.assinatura,
+                                 self.memoria_match.revisao if self.memoria_match is not None else None)
+
+        with metricas.etapa("parse_pedidos"):
+            df_pedidos = self._parse_em_cache("pedidos", [arquivo_excel], resolvedor_forn.assinatura,
+                                              lambda: pedido_repo.extrair_pedidos_excel(arquivo_excel, resolvedor_forn))
+        # Lojas do arquivo de pedidos: as únicas que esta auditoria substitui no histórico
+        self.lojas_auditadas = sorted(df_pedidos["Loja"].astype(str).unique()) if not df_pedidos.empty else []
+        with metricas.etapa("parse_xml"):
+            if self.armazem_nfe is None:
+                df_notas, textos_infcpl = self._parse_em_cache("nfe", arquivos_xml, versao_referencia,
+                                                               lambda: nfe_repo.extrair_dados_xml(arquivos_xml, dict_depara, resolvedor_forn, resolvedor_loja, memoria_match=memoria))
+            else:
+                armazem, data_notas = self.armazem_nfe, self.data_auditoria
+                # Retenção antes do registro: notas de uma data antiga reenviadas agora valem para esta auditoria
+                metricas.contar("nfe_purgadas", armazem.purgar(int(self.config.get("ARMAZEM_RETENCAO_DIAS", DIAS_RETENCAO))))
+                registro = armazem.registrar(arquivos_xml, data_notas)
+                for nome, valor in registro.items(): metricas.contar(f"nfe_{nome}", valor)
+                # A versão do dia muda a cada nota nova: o resultado resolvido vale enquanto nada chegar
+                versao_dia = (data_notas, armazem.versao(data_notas), versao_referencia)
+                df_notas, textos_infcpl = self._parse_em_cache("nfe-armazem", [], versao_dia,
+                                                               lambda: nfe_repo.extrair_dados_armazem(armazem, data_notas, dict_depara, resolvedor_forn, resolvedor_loja, memoria))
+
+        service = AuditoriaService(usar_ia, fuzzy_threshold, config=self.config)
+        with metricas.etapa("cruzamento"):
+            df_final = service.processar_cruzamento(df_pedidos, df_notas, textos_infcpl)
+        self.sugestoes_fornecedor = service.sugestoes_fornecedor
+
+        if self.memoria_match is not None:
+            with metricas.etapa("memoria_match"):
+                metricas.contar("memoria_acertos", self.memoria_match.acertos_em(df_notas))
+                metricas.contar("memoria_aprendidos", self.memoria_match.aprender(service.pares_fuzzy, df_notas))
+                self.memoria_match.persistir()
+
+        # Terceira via: contagem física da Doca, todas as lojas/turnos de uma vez
+        if arquivos_contagem:
+            with metricas.etapa("parse_doca"):
+                df_doca = self._parse_em_cache("doca", arquivos_contagem, "", lambda: ler_contagens(arquivos_contagem, MOTOR_EXCEL))
+            with metricas.etapa("merge_doca"):
+                df_final = aplicar_contagem(df_final, df_doca, service.TOLERANCIA_DIF)
+            metricas.contar("arquivos_doca", len(arquivos_contagem))
+            metricas.contar("linhas_doca", len(df_doca))
+        self._coletar_metricas(service, arquivos_xml, df_pedidos, df_notas, df_final, normalizar_antes)
+        return df_final
+
+    def _coletar_metricas(self, service, arquivos_xml, df_pedidos, df_notas, df_final, normalizar_antes):
+        metricas = self.metricas
+        for fase in FASES_CRUZAMENTO:
+            metricas.registrar_duracao(fase, service.tempos_fases[fase])
+            metricas.contar(f"registros_{fase}", service.registros_fases[fase])
+
+        itens_depara = int((df_notas["Origem"] == "De-Para ⚡").sum()) if not df_notas.empty else 0
+        metricas.contar("arquivos_xml", len(arquivos_xml or []))
+        metricas.contar("linhas_pedido", len(df_pedidos))
+        metricas.contar("linhas_nota", len(df_notas))
+        metricas.contar("linhas_resultado", len(df_final))
+        metricas.contar("comparacoes_fuzzy", service.motor_fuzzy.comparacoes)
+        metricas.contar("comparacoes_fornecedor", service.comparacoes_fornecedor)
+        metricas.contar("sugestoes_fornecedor", len(service.sugestoes_fornecedor))
+        metricas.contar("itens_depara", itens_depara)
+        metricas.contagens["taxa_depara"] = round(itens_depara / len(df_notas), 4) if len(df_notas) else 0.0
+        metricas.contar("ia_chamadas", len(service.auditor_ia.latencias))
+        metricas.contar("ia_acertos_cache", service.auditor_ia.acertos_cache)
+        metricas.contar("ia_falhas", service.auditor_ia.falhas)
+        if service.auditor_ia.latencias: metricas.registrar_latencias("ia", service.auditor_ia.latencias)
+        # LRU de normalizar é do processo: hits/misses desta execução, tamanho atual (workers de ingestão têm o seu)
+        normalizar = estatisticas_normalizar()
+        metricas.contar("normalizar_hits", normalizar["hits"] - normalizar_antes["hits"])
+        metricas.contar("normalizar_misses", normalizar["misses"] - normalizar_antes["misses"])
+        metricas.contagens["normalizar_cache_tamanho"] = normalizar["tamanho"]
+
+    def gerar_relatorio(self, df_final, destino):
+        """Monta o Excel da auditoria e grava em destino (caminho ou arquivo), cronometrando a etapa."""
+        with self.metricas.etapa("excel"):
+            gerar_excel_auditoria(df_final, self.sugestoes_fornecedor).save(destino)
+
+    def salvar_historico(self, df_final, diretorio=None, banco=False):
+        """Resultado + resumos por fornecedor/loja em Parquet (diretorio) e/ou no Postgres via COPY (banco)."""
+        if df_final.empty or (not diretorio and not banco): return None
+        with self.metricas.etapa("historico"):
+            tabelas = montar_historico(df_final, self.data_auditoria, lojas=self.lojas_auditadas)
+            if diretorio: gravar_parquet(tabelas, diretorio)
+            if banco: self.db_repo.gravar_historico(tabelas)
+        self.metricas.contar("linhas_historico", len(tabelas[TABELA_HISTORICO]))
+        return tabelas
+
+    def publicar_metricas(self):
+        self.metricas.publicar(self.config.get("METRICAS_PROMETHEUS", CAMINHO_PROMETHEUS))
+        return self.metricas.resumo()
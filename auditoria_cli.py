@@ -0,0 +1,109 @@
+"""Auditoria sem interface: pedido + pasta de XMLs (+ contagem da Doca) -> relatório Excel.
+
+Uso:
+    python auditoria_cli.py --pedidos Pedidos.xlsx --xml-dir notas/ [--doca Contagem.xlsx] [--saida Auditoria.xlsx]
+    python auditoria_cli.py --pedidos Pedidos.xlsx --armazem [--xml-dir novas/] [--data 2026-01-31]
+    python auditoria_cli.py --pedidos Pedidos.xlsx --armazem --historico [historico/] [--historico-banco]
+"""
+import time
+
+_INICIO = time.perf_counter()
+
+import argparse
+import logging
+import os
+import sys
+from contextlib import ExitStack
+from datetime import datetime
+from pathlib import Path
+
+from armazem_nfe import ArmazemNFe, CAMINHO_ARMAZEM
+from auditoria import AuditoriaController
+from memoria_match import MemoriaMatch, CAMINHO_MEMORIA
+from historico import DIR_HISTORICO
+from cache_entradas import ArquivoEmDisco
+from configuracao import carregar_configuracao
+
+logger = logging.getLogger("FLV_Enterprise")
+
+def listar_xmls(diretorio):
+    # ZIPs (do portal da SEFAZ ou do fornecedor) entram inteiros; os membros são lidos na ingestão
+    return sorted(p for p in Path(diretorio).rglob("*") if p.is_file() and p.suffix.lower() in (".xml", ".zip"))
+
+def _argumentos(argv):
+    parser = argparse.ArgumentParser(description="Auditoria FLV (pedido x NF-e x Doca) sem interface.")
+    parser.add_argument("--pedidos", required=True, help="Planilha de pedidos (.xlsx)")
+    parser.add_argument("--xml-dir", help="Pasta com os XMLs/ZIPs das NF-e (busca recursiva)")
+    parser.add_argument("--armazem", nargs="?", const=CAMINHO_ARMAZEM, help=f"Acumula as NF-e por chave de acesso no SQLite (padrão: {CAMINHO_ARMAZEM}) e audita as do dia")
+    parser.add_argument("--memoria", nargs="?", const=CAMINHO_MEMORIA, help=f"Memória de matches fuzzy confirmados (padrão: {CAMINHO_MEMORIA}), lida e atualizada a cada execução")
+    parser.add_argument("--exportar-depara", help="Com --memoria: grava em CSV os candidatos a linhas do depara_flv")
+    parser.add_argument("--data", help="Dia de recebimento auditado com --armazem (AAAA-MM-DD, padrão: hoje)")
+    parser.add_argument("--historico", nargs="?", const=DIR_HISTORICO, help=f"Grava o resultado e os resumos por fornecedor/loja em Parquet particionado (padrão: {DIR_HISTORICO}/)")
+    parser.add_argument("--historico-banco", action="store_true", help="Carrega o histórico nas tabelas auditoria_historico/auditoria_resumo_* via COPY")
+    parser.add_argument("--doca", nargs="*", default=[], help="Arquivos de contagem da Doca (.xlsx/.csv)")
+    parser.add_argument("--saida", help="Relatório de saída (padrão: Auditoria_<data>.xlsx)")
+    parser.add_argument("--config", help="Arquivo TOML ou .env (padrão: .streamlit/secrets.toml + variáveis de ambiente)")
+    parser.add_argument("--limiar", type=int, default=85, help="Limiar de similaridade do fuzzy (50-100)")
+    parser.add_argument("--ia", action="store_true", help="Ativa o Auditor IA (requer GEMINI_API_KEY)")
+    args = parser.parse_args(argv)
+    if not args.xml_dir and not args.armazem: parser.error("informe --xml-dir, --armazem ou ambos")
+    if args.exportar_depara and not args.memoria: parser.error("--exportar-depara requer --memoria")
+    return args
+
+def main(argv=None):
+    args = _argumentos(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s - %(message)s")
+    logger.info(f"Inicialização: {(time.perf_counter() - _INICIO) * 1000:.0f} ms")
+
+    config = carregar_configuracao(args.config)
+    if "DATABASE_URL" not in config:
+        logger.critical("DATABASE_URL ausente (arquivo de configuração ou variável de ambiente).")
+        return 2
+
+    caminhos_xml = listar_xmls(args.xml_dir) if args.xml_dir else []
+    if args.xml_dir and not caminhos_xml and not args.armazem:
+        logger.critical(f"Nenhum XML encontrado em {args.xml_dir}.")
+        return 2
+
+    inicio = time.perf_counter()
+    try:
+        controller = AuditoriaController(config=config, armazem_nfe=ArmazemNFe(args.armazem) if args.armazem else None,
+                                         memoria_match=MemoriaMatch(args.memoria) if args.memoria else None)
+        with ExitStack() as pilha:
+            arquivo_pedidos = pilha.enter_context(open(args.pedidos, "rb"))
+            arquivos_xml = [ArquivoEmDisco(p) for p in caminhos_xml]
+            arquivos_doca = [pilha.enter_context(open(p, "rb")) for p in args.doca]
+            df_final = controller.executar_auditoria(arquivo_pedidos, arquivos_xml, args.ia, args.limiar, arquivos_doca, args.data)
+    except Exception as e:
+        logger.critical(f"Erro crítico no processamento da auditoria: {e}")
+        return 2
+
+    if df_final.empty:
+        logger.error("Nenhum dado cruzado.")
+        controller.publicar_metricas()
+        return 1
+
+    if args.exportar_depara:
+        candidatos = controller.memoria_match.candidatos_depara(controller.db_repo.carregar_dicionario_depara())
+        candidatos.to_csv(args.exportar_depara, index=False)
+        logger.info(f"{len(candidatos)} candidatos ao De-Para -> {args.exportar_depara}")
+
+    for sugestao in controller.sugestoes_fornecedor.itertuples(index=False):
+        logger.warning(f"Fornecedor '{sugestao.nome_original}' na NF-e parece ser '{sugestao.nome_macro}' do pedido: "
+                       f"{sugestao.itens} itens em {sugestao.lojas} loja(s), score médio {sugestao.score_medio}")
+
+    saida = args.saida or f"Auditoria_{datetime.now().strftime('%Y%m%d%H%M')}.xlsx"
+    os.makedirs(os.path.dirname(saida) or ".", exist_ok=True)
+    controller.gerar_relatorio(df_final, saida)
+    if args.historico or args.historico_banco:
+        try:
+            controller.salvar_historico(df_final, args.historico, args.historico_banco)
+        except Exception as e:
+            # O relatório já foi gerado: falha no histórico não derruba a execução
+            logger.error(f"Histórico não gravado: {e}")
+    controller.publicar_metricas()
+    logger.info(f"Auditoria concluída em {time.perf_counter() - inicio:.1f} s: {len(df_final)} linhas, {len(caminhos_xml)} arquivos de NF-e -> {saida}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,307 @@
+import io
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import pandas as pd
+import psycopg2
+from psycopg2 import pool as pg_pool
+
+logger = logging.getLogger("FLV_Enterprise")
+
+SQL_DEPARA = "SELECT cnpj_fornecedor, cod_produto_xml, descricao_interna, fator_conversao FROM depara_flv"
+SQL_FORNECEDORES = "SELECT nome_original, nome_macro FROM fornecedores_mapeamento ORDER BY prioridade DESC"
+SQL_LOJAS = "SELECT padrao, tipo, loja FROM lojas_mapeamento ORDER BY prioridade DESC"
+
+# ==========================================
+# POOL DE CONEXÕES (um por processo)
+# ==========================================
+POOL_MIN_CONEXOES = 1
+POOL_MAX_CONEXOES = 8
+POOL_ESPERA_S = 30.0
+
+_POOLS = {}
+_LOCK_POOL = threading.Lock()
+
+def obter_pool(dsn, max_conexoes=None):
+    """(pool, vagas) do dsn. max_conexoes (DB_POOL_MAX_CONEXOES) só vale na criação: o pool vive o processo inteiro."""
+    # Sobrevive aos reruns do Streamlit: o módulo é importado uma vez por processo
+    with _LOCK_POOL:
+        if dsn not in _POOLS:
+            maximo = max(int(max_conexoes or POOL_MAX_CONEXOES), POOL_MIN_CONEXOES)
+            # O ThreadedConnectionPool levanta PoolError quando esgota; o semáforo faz a sessão excedente esperar
+            _POOLS[dsn] = pg_pool.ThreadedConnectionPool(POOL_MIN_CONEXOES, maximo, dsn), threading.BoundedSemaphore(maximo)
+        return _POOLS[dsn]
+
+@contextmanager
+def conexao(dsn, max_conexoes=None, espera=POOL_ESPERA_S):
+    """Empresta uma conexão do pool dentro de uma transação; conexões mortas são descartadas.
+
+    Com o pool cheio, espera até `espera` segundos por uma conexão devolvida antes de desistir.
+    """
+    pool, vagas = obter_pool(dsn, max_conexoes)
+    if not vagas.acquire(timeout=espera):
+        raise pg_pool.PoolError(f"Nenhuma conexão livre no pool após {espera:.0f} s (aumente DB_POOL_MAX_CONEXOES).")
+    try:
+        conn = pool.getconn()
+        if conn.closed:
+            pool.putconn(conn, close=True)
+            conn = pool.getconn()
+        try:
+            with conn:
+                yield conn
+        except psycopg2.OperationalError:
+            # Neon encerra conexões ociosas: não devolve ao pool uma conexão quebrada
+            pool.putconn(conn, close=True)
+            conn = None
+            raise
+        finally:
+            if conn is not None: pool.putconn(conn)
+    finally:
+        vagas.release()
+
+def fechar_pools():
+    with _LOCK_POOL:
+        for pool, _ in _POOLS.values(): pool.closeall()
+        _POOLS.clear()
+
+# ==========================================
+# CARGA DOS DADOS DE REFERÊNCIA (uma sessão)
+# ==========================================
+def _ler_tabela_copy(cursor, sql, colunas):
+    # COPY TO STDOUT: uma única transferência em CSV, sem materializar tuplas linha a linha
+    buffer = io.StringIO()
+    cursor.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv)", buffer)
+    buffer.seek(0)
+    return pd.read_csv(buffer, header=None, names=colunas, dtype=str, keep_default_na=False, na_filter=False)
+
+def _ler_tabela_cursor(cursor, sql, colunas):
+    # Fallback para conexões sem COPY (ex.: SQLite como dublê local)
+    cursor.execute(sql)
+    return pd.DataFrame(cursor.fetchall(), columns=colunas, dtype=object).fillna("").astype(str)
+
+def _chaves_depara(df):
+    return zip(df["cnpj"].str.replace(r"\D", "", regex=True), df["cod_xml"].str.strip().str.lstrip("0"))
+
+def montar_dicionario_depara(df):
+    desc_int = df["desc_int"].str.strip()
+    fator = df["fator"].astype(float)
+    return dict(zip(_chaves_depara(df), zip(desc_int, fator.tolist())))
+
+def carregar_mapeamentos(conn):
+    """Fornecedores e lojas numa única sessão. Retorna (mapping_forn, mapping_nome, mapping_cnpj)."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(SQL_FORNECEDORES)
+        mapping_forn = {}
+        for original, macro in cursor.fetchall():
+            mapping_forn[original.upper().strip()] = macro
+
+        cursor.execute(SQL_LOJAS)
+        mapping_nome, mapping_cnpj = [], []
+        for padrao, tipo, loja in cursor.fetchall():
+            if tipo == 'N': mapping_nome.append((padrao.upper(), loja))
+            else: mapping_cnpj.append((padrao, loja))
+    finally:
+        cursor.close()
+
+    return mapping_forn, mapping_nome, mapping_cnpj
+
+def carregar_depara(conn):
+    cursor = conn.cursor()
+    try:
+        ler_tabela = _ler_tabela_copy if hasattr(cursor, "copy_expert") else _ler_tabela_cursor
+        return montar_dicionario_depara(ler_tabela(cursor, SQL_DEPARA, ["cnpj", "cod_xml", "desc_int", "fator"]))
+    finally:
+        cursor.close()
+
+def carregar_dados_referencia(conn):
+    """Lê De-Para, fornecedores e lojas numa única sessão.
+
+    Retorna (dict_depara, mapping_forn, mapping_nome, mapping_cnpj) no mesmo formato dos carregadores individuais.
+    """
+    return (carregar_depara(conn), *carregar_mapeamentos(conn))
+
+# ==========================================
+# CACHE INCREMENTAL DO DE-PARA (watermark em updated_at)
+# ==========================================
+SQL_DEPARA_VERSAO = "SELECT max(updated_at), count(*) FROM depara_flv"
+SQL_DEPARA_ALTERADOS = "SELECT cnpj_fornecedor, cod_produto_xml, descricao_interna, fator_conversao, updated_at FROM depara_flv WHERE updated_at >= %s ORDER BY updated_at"
+SQL_DEPARA_CHAVES = "SELECT cnpj_fornecedor, cod_produto_xml FROM depara_flv"
+
+class CacheDePara:
+    """Dicionário De-Para mantido em memória e atualizado só com o que mudou desde o último watermark.
+
+    Sem coluna updated_at na tabela, degrada para recarga completa quando count(*) muda ou o TTL expira.
+    """
+    def __init__(self, intervalo_verificacao=30.0, ttl_sem_versao=3600.0):
+        self.intervalo_verificacao = intervalo_verificacao
+        self.ttl_sem_versao = ttl_sem_versao
+        self.dict_depara = None
+        self._watermark, self._linhas = None, 0
+        self._com_versao = True
+        self._forcar_carga = False
+        self._ultima_verificacao = self._ultima_carga = 0.0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.refreshes = 0
+        self.latencias_refresh = deque(maxlen=200)
+        # Incrementada a cada mudança aplicada ao dicionário: compõe a chave dos caches de entradas parseadas
+        self.versao = 0
+
+    def invalidar(self):
+        """Força uma recarga completa no próximo acesso (chamado pela aba Gestão De-Para após edições).
+
+        Edição de linha existente não muda count(*) e, sem updated_at (ou sem trigger que o atualize), não seria vista.
+        """
+        with self._lock: self._forcar_carga, self._ultima_verificacao = True, 0.0
+
+    def obter(self, abrir_conexao, com_mapeamentos=False):
+        """Dicionário atualizado; com_mapeamentos devolve (dict_depara, (mapping_forn, mapping_nome, mapping_cnpj)).
+
+        Os cadastros vêm na mesma sessão da verificação: na carga fria, as três tabelas são lidas de uma vez.
+        """
+        with self._lock:
+            agora = time.monotonic()
+            if self.dict_depara is not None and agora - self._ultima_verificacao < self.intervalo_verificacao:
+                self.hits += 1
+                if not com_mapeamentos: return self.dict_depara
+                with abrir_conexao() as conn: return self.dict_depara, carregar_mapeamentos(conn)
+
+            inicio = time.perf_counter()
+            with abrir_conexao() as conn:
+                if self.dict_depara is None or self._forcar_carga: mapeamentos = self._carga_completa(conn, com_mapeamentos)
+                else:
+                    self._atualizar(conn)
+                    mapeamentos = carregar_mapeamentos(conn) if com_mapeamentos else None
+            self._ultima_verificacao = time.monotonic()
+            self.latencias_refresh.append(time.perf_counter() - inicio)
+            return (self.dict_depara, mapeamentos) if com_mapeamentos else self.dict_depara
+
+    def _versao(self, conn):
+        cursor = conn.cursor()
+        try:
+            if self._com_versao:
+                try:
+                    cursor.execute(SQL_DEPARA_VERSAO)
+                    return cursor.fetchone()
+                except psycopg2.ProgrammingError:
+                    conn.rollback()
+                    self._com_versao = False
+                    logger.warning("depara_flv sem coluna updated_at: cache De-Para em modo recarga completa.")
+            cursor.execute("SELECT count(*) FROM depara_flv")
+            return None, cursor.fetchone()[0]
+        finally:
+            cursor.close()
+
+    def _carga_completa(self, conn, com_mapeamentos=False):
+        self.misses += 1
+        self._watermark, self._linhas = self._versao(conn)
+        if com_mapeamentos: self.dict_depara, *mapeamentos = carregar_dados_referencia(conn)
+        else: self.dict_depara, mapeamentos = carregar_depara(conn), None
+        self._forcar_carga = False
+        self.versao += 1
+        self._ultima_carga = time.monotonic()
+        return tuple(mapeamentos) if mapeamentos else None
+
+    def _atualizar(self, conn):
+        watermark, linhas = self._versao(conn)
+        if not self._com_versao:
+            if linhas != self._linhas or time.monotonic() - self._ultima_carga > self.ttl_sem_versao: self._carga_completa(conn)
+            else: self.hits += 1
+            return
+        if watermark == self._watermark and linhas == self._linhas:
+            self.hits += 1
+            return
+        if self._watermark is None:
+            # Tabela vazia (ou sem datas) na última carga: não há watermark de onde partir
+            self._carga_completa(conn)
+            return
+
+        self.refreshes += 1
+        cursor = conn.cursor()
+        try:
+            novas_chaves = 0
+            # >= no watermark: linhas gravadas depois com o mesmo updated_at não se perdem; as já vistas só se repetem
+            cursor.execute(SQL_DEPARA_ALTERADOS, (self._watermark,))
+            alterados = pd.DataFrame(cursor.fetchall(), columns=["cnpj", "cod_xml", "desc_int", "fator", "updated_at"], dtype=object)
+            if not alterados.empty:
+                # Ordenado por updated_at: numa chave repetida, a versão mais recente vence no dicionário
+                delta = montar_dicionario_depara(alterados[["cnpj", "cod_xml", "desc_int", "fator"]].fillna("").astype(str))
+                novas_chaves = sum(1 for chave in delta if chave not in self.dict_depara)
+                self.dict_depara.update(delta)
+
+            # Contagem que não fecha = exclusão ou troca de chave: reconcilia só as chaves (sem descrições)
+            if self._linhas + novas_chaves != linhas:
+                cursor.execute(SQL_DEPARA_CHAVES)
+                vivas = set(_chaves_depara(pd.DataFrame(cursor.fetchall(), columns=["cnpj", "cod_xml"], dtype=object).fillna("").astype(str)))
+                for chave in [c for c in self.dict_depara if c not in vivas]: del self.dict_depara[chave]
+        finally:
+            cursor.close()
+        self._watermark, self._linhas = watermark, linhas
+        self.versao += 1
+
+    def estatisticas(self):
+        latencias = sorted(self.latencias_refresh)
+        return {"hits": self.hits, "misses": self.misses, "refreshes": self.refreshes, "versao": self.versao,
+                "entradas": len(self.dict_depara) if self.dict_depara is not None else 0,
+                "watermark": str(self._watermark) if self._watermark is not None else None,
+                "latencia_ultima_ms": round(self.latencias_refresh[-1] * 1000, 1) if latencias else None,
+                "latencia_p50_ms": round(latencias[len(latencias) // 2] * 1000, 1) if latencias else None}
+
+_CACHE_DEPARA = CacheDePara()
+
+def cache_depara():
+    return _CACHE_DEPARA
+
+# ==========================================
+# HISTÓRICO DAS AUDITORIAS (carga em massa via COPY)
+# ==========================================
+DDL_HISTORICO = """
+CREATE TABLE IF NOT EXISTS auditoria_historico (
+    data_auditoria date NOT NULL, execucao text NOT NULL, loja text, fornecedor text, produto_pedido text, produto_xml text,
+    qtd_pedido double precision, qtd_nota double precision, origem_match text, diferenca double precision, status_visual text,
+    status_codigo smallint, justificativa_ia text, qtd_fisico double precision, padrao_fisico double precision, status_doca text,
+    diferenca_doca double precision
+);
+CREATE INDEX IF NOT EXISTS idx_auditoria_historico_data_loja ON auditoria_historico (data_auditoria, loja);
+CREATE TABLE IF NOT EXISTS auditoria_resumo_fornecedor (
+    data_auditoria date NOT NULL, execucao text NOT NULL, loja text NOT NULL, fornecedor text NOT NULL, linhas integer, itens_pedidos integer, itens_ok integer, itens_falta integer,
+    itens_sobra integer, itens_extra integer, itens_sem_nota integer, itens_justificados integer, itens_doca_divergente integer,
+    qtd_pedida double precision, qtd_faturada double precision, falta_kg double precision, sobra_kg double precision, taxa_falta double precision,
+    PRIMARY KEY (data_auditoria, loja, fornecedor)
+);
+CREATE TABLE IF NOT EXISTS auditoria_resumo_loja (
+    data_auditoria date NOT NULL, execucao text NOT NULL, loja text NOT NULL, linhas integer, itens_pedidos integer, itens_ok integer, itens_falta integer,
+    itens_sobra integer, itens_extra integer, itens_sem_nota integer, itens_justificados integer, itens_doca_divergente integer,
+    qtd_pedida double precision, qtd_faturada double precision, falta_kg double precision, sobra_kg double precision, taxa_falta double precision,
+    PRIMARY KEY (data_auditoria, loja)
+);
+"""
+
+def _copiar_tabela(cursor, tabela, df):
+    # COPY FROM STDIN em CSV: uma transferência por tabela em vez de um INSERT por linha (vazio sem aspas = NULL)
+    buffer = io.StringIO()
+    df.to_csv(buffer, header=False, index=False)
+    buffer.seek(0)
+    colunas = ", ".join(df.columns)
+    cursor.copy_expert(f"COPY {tabela} ({colunas}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+def gravar_historico(conn, tabelas):
+    """tabelas = {nome: DataFrame} de historico.montar_historico, numa única transação.
+
+    Só as linhas das (data, loja) presentes são substituídas: outras lojas auditadas no mesmo dia ficam.
+    """
+    from historico import pares_data_loja
+    cursor = conn.cursor()
+    try:
+        cursor.execute(DDL_HISTORICO)
+        for tabela, df in tabelas.items():
+            if df.empty: continue
+            for data_auditoria, lojas in pares_data_loja(df).items():
+                cursor.execute(f"DELETE FROM {tabela} WHERE data_auditoria = %s AND loja = ANY(%s)", (data_auditoria, lojas))
+            _copiar_tabela(cursor, tabela, df)
+    finally:
+        cursor.close()
+    return {tabela: len(df) for tabela, df in tabelas.items()}
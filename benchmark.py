@@ -0,0 +1,134 @@
+"""Benchmark do pipeline de auditoria com dados sintéticos, em múltiplos do volume diário.
+
+Uso:
+    python benchmark.py                       # 1x, 10x e 100x; compara com benchmark_baseline.json se existir
+    python benchmark.py --escalas 1 10 --gravar-baseline
+Sai com código 1 se alguma etapa ficar mais lenta que o baseline além da tolerância.
+"""
+import argparse
+import gc
+import io
+import json
+import logging
+import os
+import sys
+import time
+
+from auditoria import AuditoriaService, NFeRepository, PedidoRepository, FASES_CRUZAMENTO, MOTOR_EXCEL
+from doca import ler_contagens, aplicar_contagem
+from gerador_sintetico import cenario_por_escala, referencias, gerar_xmls, gerar_pedidos_xlsx, gerar_matriz_comprador, gerar_contagens_doca
+from preparador import ler_planilhas_comprador, parsear_matriz_comprador
+from relatorios import gerar_excel_auditoria, gerar_excel_preparador
+
+CAMINHO_BASELINE = "benchmark_baseline.json"
+ETAPAS = ("ingestao_xml", "pedidos", "preparador", *FASES_CRUZAMENTO, "cruzamento", "parse_doca", "merge_doca", "excel_auditoria", "excel_preparador")
+
+# Abaixo deste tempo absoluto a variação é ruído de medição, não regressão
+PISO_REGRESSAO_S = 0.05
+
+def _cronometrar(tempos, etapa, func, *args):
+    inicio = time.perf_counter()
+    resultado = func(*args)
+    tempos[etapa] = time.perf_counter() - inicio
+    return resultado
+
+def _rebobinar(arquivos):
+    for arquivo in arquivos: arquivo.seek(0)
+    return arquivos
+
+def medir_escala(escala, fuzzy_threshold=85, max_workers=None, ruido=0.3):
+    """Uma passada completa do pipeline; devolve {etapa: segundos} e o volume processado."""
+    cenario = cenario_por_escala(escala, ruido=ruido)
+    dict_depara, resolvedor_forn, resolvedor_loja = referencias(cenario)
+    arquivos_xml, pedidos, matriz = gerar_xmls(cenario), gerar_pedidos_xlsx(cenario), gerar_matriz_comprador(cenario)
+    contagens = gerar_contagens_doca(cenario)
+    tempos = {}
+    gc.collect()
+
+    df_notas, textos_infcpl = _cronometrar(tempos, "ingestao_xml", NFeRepository().extrair_dados_xml,
+                                           _rebobinar(arquivos_xml), dict_depara, resolvedor_forn, resolvedor_loja, max_workers)
+    df_pedidos = _cronometrar(tempos, "pedidos", PedidoRepository().extrair_pedidos_excel, pedidos, resolvedor_forn)
+    df_matriz, _ = _cronometrar(tempos, "preparador", lambda: parsear_matriz_comprador(ler_planilhas_comprador(matriz)))
+
+    service = AuditoriaService(False, fuzzy_threshold, max_workers=max_workers)
+    df_final = _cronometrar(tempos, "cruzamento", service.processar_cruzamento, df_pedidos, df_notas, textos_infcpl)
+    tempos.update(service.tempos_fases)
+    df_doca = _cronometrar(tempos, "parse_doca", ler_contagens, contagens, MOTOR_EXCEL)
+    df_final = _cronometrar(tempos, "merge_doca", aplicar_contagem, df_final, df_doca)
+
+    _cronometrar(tempos, "excel_auditoria", lambda: gerar_excel_auditoria(df_final).save(io.BytesIO()))
+    _cronometrar(tempos, "excel_preparador", lambda: gerar_excel_preparador(df_matriz, "01/01/2026").save(io.BytesIO()))
+
+    volume = {"xmls": len(arquivos_xml), "linhas_nota": len(df_notas), "linhas_pedido": len(df_pedidos), "linhas_resultado": len(df_final)}
+    return tempos, volume
+
+def medir(escalas, repeticoes=1, **kwargs):
+    """Melhor tempo de cada etapa em `repeticoes` passadas, por escala."""
+    resultados = {}
+    for escala in escalas:
+        melhores, volume = {}, {}
+        for _ in range(repeticoes):
+            tempos, volume = medir_escala(escala, **kwargs)
+            for etapa, segundos in tempos.items(): melhores[etapa] = min(segundos, melhores.get(etapa, float("inf")))
+        resultados[f"{escala}x"] = {"tempos": melhores, "volume": volume}
+    return resultados
+
+def comparar(resultados, baseline, tolerancia):
+    """Lista de (escala, etapa, atual, referência) que pioraram além da tolerância relativa e do piso absoluto."""
+    regressoes = []
+    for escala, dados in resultados.items():
+        referencia = baseline.get(escala, {}).get("tempos", {})
+        for etapa, atual in dados["tempos"].items():
+            anterior = referencia.get(etapa)
+            if anterior is None: continue
+            if atual > anterior * (1 + tolerancia) and atual - anterior > PISO_REGRESSAO_S:
+                regressoes.append((escala, etapa, atual, anterior))
+    return regressoes
+
+def formatar_tabela(resultados, baseline=None):
+    escalas = list(resultados)
+    linhas = [f"{'etapa':<18}" + "".join(f"{escala:>20}" for escala in escalas)]
+    for etapa in ETAPAS:
+        celulas = []
+        for escala in escalas:
+            atual = resultados[escala]["tempos"].get(etapa)
+            anterior = (baseline or {}).get(escala, {}).get("tempos", {}).get(etapa)
+            texto = "-" if atual is None else f"{atual * 1000:.1f}ms" + (f" ({(atual / anterior - 1) * 100:+.0f}%)" if anterior else "")
+            celulas.append(f"{texto:>20}")
+        linhas.append(f"{etapa:<18}" + "".join(celulas))
+    for chave in ("xmls", "linhas_nota", "linhas_pedido", "linhas_resultado"):
+        linhas.append(f"{chave:<18}" + "".join(f"{resultados[escala]['volume'][chave]:>20}" for escala in escalas))
+    return "\n".join(linhas)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline de auditoria com dados sintéticos.")
+    parser.add_argument("--escalas", type=int, nargs="+", default=[1, 10, 100], help="Múltiplos do volume diário")
+    parser.add_argument("--repeticoes", type=int, default=1)
+    parser.add_argument("--limiar", type=int, default=85)
+    parser.add_argument("--workers", type=int, help="Processos da ingestão de XML e do cruzamento (padrão: CPUs)")
+    parser.add_argument("--baseline", default=CAMINHO_BASELINE)
+    parser.add_argument("--gravar-baseline", action="store_true", help="Grava os tempos medidos como novo baseline")
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="Piora relativa aceita antes de falhar (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger("FLV_Enterprise").setLevel(logging.WARNING)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f: baseline = json.load(f)
+
+    resultados = medir(args.escalas, args.repeticoes, fuzzy_threshold=args.limiar, max_workers=args.workers)
+    print(formatar_tabela(resultados, baseline))
+
+    if args.gravar_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f: json.dump({**baseline, **resultados}, f, indent=2)
+        print(f"\nBaseline gravado em {args.baseline}")
+        return 0
+
+    regressoes = comparar(resultados, baseline, args.tolerancia)
+    for escala, etapa, atual, anterior in regressoes:
+        print(f"REGRESSÃO {escala} {etapa}: {atual * 1000:.1f}ms (baseline {anterior * 1000:.1f}ms)")
+    return 1 if regressoes else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+import hashlib
+import logging
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+logger = logging.getLogger("FLV_Enterprise")
+
+# ==========================================
+# CACHE DE ENTRADAS PARSEADAS (endereçado por conteúdo)
+# ==========================================
+# Uploads parseados sobrevivem aos reruns do Streamlit: mudar o limiar ou a IA só refaz o cruzamento
+LIMITE_PADRAO_MB = 256
+BLOCO_HASH = 1024 * 1024
+
+class ArquivoEmDisco(os.PathLike):
+    """Arquivo da CLI aberto só quando lido: milhares de XMLs não esgotam os descritores (ulimit -n).
+
+    Tem getvalue() como o UploadedFile; ZipFile e pandas abrem pelo caminho (__fspath__).
+    """
+    def __init__(self, caminho):
+        self.name = os.fspath(caminho)
+
+    def __fspath__(self):
+        return self.name
+
+    def getvalue(self):
+        with open(self.name, "rb") as f: return f.read()
+
+def conteudo(arquivo):
+    """Bytes do upload sem consumir o arquivo (UploadedFile/BytesIO ou arquivo aberto)."""
+    if hasattr(arquivo, "getvalue"): return arquivo.getvalue()
+    posicao = arquivo.tell()
+    dados = arquivo.read()
+    arquivo.seek(posicao)
+    return dados
+
+def chave_conteudo(tipo, arquivos, versao_referencia):
+    # A ordem dos arquivos entra no hash: ela define a ordem das linhas e qual infCpl prevalece
+    h = hashlib.sha256(f"{tipo}|{versao_referencia}".encode("utf-8"))
+    for arquivo in arquivos:
+        if isinstance(arquivo, ArquivoEmDisco):
+            with open(arquivo, "rb") as f: _hash_arquivo(h, f)
+        elif hasattr(arquivo, "getvalue"):
+            dados = arquivo.getvalue()
+            h.update(len(dados).to_bytes(8, "little"))
+            h.update(dados)
+        else: _hash_arquivo(h, arquivo)
+    return h.hexdigest()
+
+def _hash_arquivo(h, arquivo):
+    # Arquivo em disco (ZIPs grandes na CLI): lido em blocos, sem carregar tudo, e devolvido à posição original
+    posicao = arquivo.tell()
+    h.update((arquivo.seek(0, os.SEEK_END) - posicao).to_bytes(8, "little"))
+    arquivo.seek(posicao)
+    while bloco := arquivo.read(BLOCO_HASH): h.update(bloco)
+    arquivo.seek(posicao)
+
+def tamanho_aproximado(valor):
+    if isinstance(valor, pd.DataFrame): return int(valor.memory_usage(deep=True).sum())
+    if isinstance(valor, pd.Series): return int(valor.memory_usage(deep=True))
+    if isinstance(valor, dict): return sys.getsizeof(valor) + sum(tamanho_aproximado(k) + tamanho_aproximado(v) for k, v in valor.items())
+    if isinstance(valor, (list, tuple)): return sys.getsizeof(valor) + sum(tamanho_aproximado(v) for v in valor)
+    return sys.getsizeof(valor)
+
+class CacheEntradas:
+    """LRU limitado pelo tamanho (bytes) dos resultados guardados, não pelo número de entradas."""
+    def __init__(self, limite_bytes=LIMITE_PADRAO_MB * 1024 * 1024):
+        self.limite_bytes = limite_bytes
+        self._itens = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.despejos = 0
+
+    def obter(self, chave):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                self.misses += 1
+                return None
+            self._itens.move_to_end(chave)
+            self.hits += 1
+            return item[0]
+
+    def gravar(self, chave, valor):
+        tamanho = tamanho_aproximado(valor)
+        if tamanho > self.limite_bytes:
+            logger.info(f"Entrada de {tamanho / 2**20:.1f} MB maior que o cache ({self.limite_bytes / 2**20:.0f} MB); não armazenada.")
+            return
+        with self._lock:
+            antigo = self._itens.pop(chave, None)
+            if antigo is not None: self._bytes -= antigo[1]
+            self._itens[chave] = (valor, tamanho)
+            self._bytes += tamanho
+            self._despejar()
+
+    def _despejar(self):
+        while self._bytes > self.limite_bytes:
+            _, (_, tamanho_despejado) = self._itens.popitem(last=False)
+            self._bytes -= tamanho_despejado
+            self.despejos += 1
+
+    def redimensionar(self, limite_bytes):
+        """Novo limite sem perder o conteúdo; ao diminuir, despeja os menos usados até caber."""
+        with self._lock:
+            self.limite_bytes = limite_bytes
+            self._despejar()
+
+    def estatisticas(self):
+        return {"hits": self.hits, "misses": self.misses, "despejos": self.despejos, "entradas": len(self._itens),
+                "mb": round(self._bytes / 2**20, 2), "limite_mb": round(self.limite_bytes / 2**20, 2)}
+
+_CACHE_PADRAO = None
+
+def cache_padrao(limite_mb=LIMITE_PADRAO_MB):
+    # Instância única por processo, compartilhada pelas sessões do Streamlit; CACHE_ENTRADAS_MB alterado vale no próximo acesso
+    global _CACHE_PADRAO
+    limite_bytes = int(limite_mb * 1024 * 1024)
+    if _CACHE_PADRAO is None: _CACHE_PADRAO = CacheEntradas(limite_bytes)
+    elif _CACHE_PADRAO.limite_bytes != limite_bytes: _CACHE_PADRAO.redimensionar(limite_bytes)
+    return _CACHE_PADRAO
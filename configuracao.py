@@ -0,0 +1,37 @@
+import os
+
+# ==========================================
+# CONFIGURAÇÃO FORA DO STREAMLIT (CLI / cron)
+# ==========================================
+CHAVES_CONFIG = ("DATABASE_URL", "GEMINI_API_KEY", "IA_MAX_CONCORRENCIA", "IA_REQUISICOES_POR_SEGUNDO", "IA_TIMEOUT", "METRICAS_PROMETHEUS", "CACHE_ENTRADAS_MB", "CRUZAMENTO_PROCESSOS", "HISTORICO_DIR", "HISTORICO_POSTGRES", "DB_POOL_MAX_CONEXOES", "ARMAZEM_RETENCAO_DIAS")
+CAMINHO_PADRAO = os.path.join(".streamlit", "secrets.toml")
+
+def _ler_toml(caminho):
+    try:
+        import tomllib
+        with open(caminho, "rb") as f: return tomllib.load(f)
+    except ImportError:
+        import toml
+        return toml.load(caminho)
+
+def _ler_env(caminho):
+    config = {}
+    with open(caminho, encoding="utf-8") as f:
+        for linha in f:
+            linha = linha.strip()
+            if not linha or linha.startswith("#") or "=" not in linha: continue
+            chave, valor = linha.removeprefix("export ").split("=", 1)
+            config[chave.strip()] = valor.strip().strip('"').strip("'")
+    return config
+
+def carregar_configuracao(caminho=None):
+    """Lê um TOML (mesmo formato do secrets.toml) ou um arquivo .env; variáveis de ambiente prevalecem.
+
+    Sem caminho, usa .streamlit/secrets.toml quando existir.
+    """
+    if caminho is None and os.path.exists(CAMINHO_PADRAO): caminho = CAMINHO_PADRAO
+    config = {}
+    if caminho:
+        config.update(_ler_env(caminho) if caminho.endswith(".env") else _ler_toml(caminho))
+    config.update({chave: os.environ[chave] for chave in CHAVES_CONFIG if chave in os.environ})
+    return config
@@ -0,0 +1,153 @@
+import logging
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from normalizacao import normalizar, normalizar_serie
+
+logger = logging.getLogger("FLV_Enterprise")
+
+# ==========================================
+# CONTAGEM FÍSICA DA DOCA (terceira via do cruzamento)
+# ==========================================
+# Cabeçalhos aceitos (já normalizados); a primeira coluna que casar vence
+ALIASES_PRODUTO = ("DESCRICAO", "PRODUTO", "PRODUTO PEDIDO", "DESC")
+ALIASES_CONTAGEM = ("QTD_CONTADA", "QTD CONTADA", "QTD_FISICA", "QTD FISICA", "QTD_DOCA", "QTD DOCA", "CONTAGEM", "CONTADO", "QTD_RECEBIDA", "QTD RECEBIDA")
+ALIASES_PADRAO = ("PADRAO_CX", "PADRAO CX", "PADRAO_DOCA", "PADRAO DOCA", "PADRAO", "PESO CX")
+ALIASES_LOJA = ("LOJA",)
+LINHAS_BUSCA_CABECALHO = 15
+
+COLUNAS_DOCA = ["Loja_Chave", "Produto", "Qtd_Fisico", "Padrao_Fisico"]
+SEM_CONTAGEM = "⚪ SEM CONTAGEM"
+
+def chave_loja(valores):
+    # "Loja_03", "L3", "LOJA 03" e 3 viram "3"; sem número, o nome normalizado
+    serie = pd.Series(valores, dtype=object).map(str)
+    numero = serie.str.extract(r"(\d+)", expand=False).str.lstrip("0").replace("", "0")
+    return numero.fillna(normalizar_serie(serie))
+
+# Aba/arquivo só identifica a loja com prefixo L/Loja: "Planilha1", "Sheet1" e datas no nome não viram loja
+_RE_LOJA_NO_NOME = re.compile(r"(?<![A-Z])L(?:OJA)?[\s_\-]*0*(\d+)")
+
+def loja_do_nome(nome):
+    """Chave da loja (como chave_loja) em nomes como "Loja_03", "L3" ou "2026-10-18_loja3.csv"; None se não houver."""
+    achado = _RE_LOJA_NO_NOME.search(normalizar(os.path.splitext(os.path.basename(str(nome)))[0]))
+    if achado is None: return None
+    return achado.group(1) or "0"
+
+def _numero(serie):
+    texto = serie.map(str).str.replace(",", ".", regex=False).str.extract(r"(-?\d+(?:\.\d+)?)", expand=False)
+    return pd.to_numeric(texto, errors="coerce")
+
+def _primeira_coluna(cabecalho, aliases):
+    for alias in aliases:
+        for pos, titulo in enumerate(cabecalho):
+            if titulo == alias: return pos
+    return None
+
+def _localizar_cabecalho(df_raw):
+    """Linha de cabeçalho nas primeiras linhas (títulos e datas costumam vir antes). Retorna (linha, colunas) ou None."""
+    for linha in range(min(LINHAS_BUSCA_CABECALHO, len(df_raw))):
+        cabecalho = [normalizar(v) for v in df_raw.iloc[linha].tolist()]
+        col_produto, col_contagem = _primeira_coluna(cabecalho, ALIASES_PRODUTO), _primeira_coluna(cabecalho, ALIASES_CONTAGEM)
+        if col_produto is not None and col_contagem is not None:
+            return linha, {"produto": col_produto, "contagem": col_contagem,
+                           "padrao": _primeira_coluna(cabecalho, ALIASES_PADRAO), "loja": _primeira_coluna(cabecalho, ALIASES_LOJA)}
+    return None
+
+def extrair_contagem_aba(df_raw, loja_padrao):
+    """Linhas contadas de uma aba: (Loja_Chave, Produto normalizado, Qtd_Fisico em kg, Padrao_Fisico).
+
+    Sem coluna "Loja" e sem loja_padrao, retorna None: a aba não é atribuída a uma loja adivinhada.
+    """
+    localizado = _localizar_cabecalho(df_raw) if not df_raw.empty else None
+    if localizado is None: return pd.DataFrame(columns=COLUNAS_DOCA)
+    linha_cab, cols = localizado
+    corpo = df_raw.iloc[linha_cab + 1:]
+
+    qtd = _numero(corpo[corpo.columns[cols["contagem"]]])
+    padrao = _numero(corpo[corpo.columns[cols["padrao"]]]) if cols["padrao"] is not None else pd.Series(1.0, index=corpo.index)
+    padrao = padrao.where(padrao > 0, 1.0)
+    validas = qtd.notna() & corpo[corpo.columns[cols["produto"]]].notna()
+    if not validas.any(): return pd.DataFrame(columns=COLUNAS_DOCA)
+    if cols["loja"] is None and loja_padrao is None: return None
+
+    lojas = corpo[corpo.columns[cols["loja"]]][validas] if cols["loja"] is not None else pd.Series(loja_padrao, index=corpo.index[validas])
+    return pd.DataFrame({"Loja_Chave": chave_loja(lojas).to_numpy(),
+                         "Produto": normalizar_serie(corpo[corpo.columns[cols["produto"]]][validas]).to_numpy(),
+                         "Qtd_Fisico": (qtd[validas] * padrao[validas]).to_numpy(dtype=float),
+                         "Padrao_Fisico": padrao[validas].to_numpy(dtype=float)})
+
+def _ler_arquivo(arquivo, motor_excel=None):
+    nome = getattr(arquivo, "name", "")
+    if nome.lower().endswith(".csv"):
+        # Planilhas exportadas no Brasil alternam ';' e ','; o sniffer do engine python resolve
+        return {os.path.splitext(os.path.basename(nome))[0]: pd.read_csv(arquivo, header=None, sep=None, engine="python", dtype=object)}
+    return pd.read_excel(arquivo, sheet_name=None, header=None, engine=motor_excel)
+
+def ler_contagens(arquivos_contagem, motor_excel=None):
+    """Todas as contagens enviadas (um arquivo por loja e turno) num único DataFrame.
+
+    A loja vem da coluna "Loja" quando existe; senão do nome da aba e, por último, do nome do arquivo
+    (só com prefixo L/Loja). Abas sem loja identificável são descartadas com aviso.
+    Contagens repetidas do mesmo produto na mesma loja (turnos) são somadas.
+    """
+    partes = []
+    for arquivo in arquivos_contagem or []:
+        try:
+            abas = _ler_arquivo(arquivo, motor_excel)
+        except Exception as e:
+            logger.error(f"Arquivo de contagem ilegível descartado ({getattr(arquivo, 'name', '?')}): {e}")
+            continue
+        nome_arquivo = getattr(arquivo, 'name', '?')
+        for nome_aba, df_raw in abas.items():
+            parte = extrair_contagem_aba(df_raw, loja_do_nome(nome_aba) or loja_do_nome(nome_arquivo))
+            if parte is None: logger.warning(f"Loja não identificada (sem coluna Loja nem L/Loja no nome da aba ou do arquivo), aba ignorada: {nome_arquivo} / {nome_aba}")
+            elif parte.empty: logger.warning(f"Aba sem contagem reconhecível: {getattr(arquivo, 'name', '?')} / {nome_aba}")
+            else: partes.append(parte)
+
+    if not partes: return pd.DataFrame(columns=COLUNAS_DOCA)
+    df_doca = pd.concat(partes, ignore_index=True)
+    return df_doca.groupby(["Loja_Chave", "Produto"], as_index=False, sort=False).agg(Qtd_Fisico=("Qtd_Fisico", "sum"), Padrao_Fisico=("Padrao_Fisico", "last"))
+
+def _rotulo(prefixo, valores):
+    return [f"{prefixo} {v:.2f}".replace('.00', '') for v in valores]
+
+def _repartir(chaves, contagem, qtd_nota):
+    # Mesma (loja, produto) em várias linhas (ex.: dois Fornecedor_Original): na ordem do relatório cada uma
+    # recebe até a sua quantidade da nota e a última fica com o restante, então a contagem só é usada uma vez
+    antes = pd.Series(qtd_nota).groupby([chaves["Loja_Chave"], chaves["Produto"]], sort=False, dropna=False).cumsum().to_numpy() - qtd_nota
+    ultima = ~chaves.duplicated(keep="last").to_numpy()
+    return np.where(ultima, np.maximum(contagem - antes, 0.0), np.clip(contagem - antes, 0.0, qtd_nota))
+
+def aplicar_contagem(df_final, df_doca, tolerancia=0.001):
+    """Preenche qtd_fisico/padrao_fisico/status_doca/diferenca_doca por merge em (loja, produto).
+
+    O produto de referência é o do pedido; itens não pedidos usam o nome da nota. A diferença é contra a NFe.
+    """
+    if df_final.empty or df_doca.empty: return df_final
+    produto = df_final["produto_pedido"].where(df_final["produto_pedido"] != "❌ NÃO PEDIDO", df_final["produto_xml"])
+    chaves = pd.DataFrame({"Loja_Chave": chave_loja(df_final["loja"]).to_numpy(), "Produto": produto.to_numpy()})
+    contagem = chaves.merge(df_doca, on=["Loja_Chave", "Produto"], how="left", validate="many_to_one")
+
+    contado = contagem["Qtd_Fisico"].notna().to_numpy()
+    if not contado.any(): return df_final
+    qtd_nota = pd.to_numeric(df_final["qtd_nota"], errors="coerce").fillna(0.0).to_numpy(dtype=float)
+    qtd_fisico = _repartir(chaves, contagem["Qtd_Fisico"].to_numpy(dtype=float), qtd_nota)
+    diferenca = np.where(contado, qtd_fisico - qtd_nota, 0.0)
+
+    ok, falta = contado & (np.abs(diferenca) < tolerancia), contado & (diferenca <= -tolerancia)
+    status = df_final["status_doca"].to_numpy(dtype=object).copy()
+    status[ok] = "🟢 DOCA OK"
+    status[falta] = _rotulo("🔴 DOCA FALTA", np.abs(diferenca[falta]))
+    sobra = contado & ~ok & ~falta
+    status[sobra] = _rotulo("🟡 DOCA SOBRA", diferenca[sobra])
+
+    df_final = df_final.copy()
+    df_final["qtd_fisico"] = np.where(contado, qtd_fisico, df_final["qtd_fisico"].to_numpy(dtype=object))
+    df_final["padrao_fisico"] = np.where(contado, contagem["Padrao_Fisico"].to_numpy(), df_final["padrao_fisico"].to_numpy(dtype=object))
+    df_final["status_doca"] = pd.Categorical(status)
+    df_final["diferenca_doca"] = np.where(contado, diferenca, df_final["diferenca_doca"].to_numpy(dtype=float))
+    return df_final
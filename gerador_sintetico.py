@@ -0,0 +1,235 @@
+"""Massa de dados sintética para benchmarks: NF-e, matriz do comprador, pedidos e contagens da Doca coerentes entre si.
+
+Uso:
+    python gerador_sintetico.py --escala 10 --saida /tmp/cenario
+"""
+import argparse
+import io
+import os
+import random
+
+import pandas as pd
+
+from normalizacao import ResolvedorFornecedor, ResolvedorLoja
+
+NAMESPACE_NFE = "http://www.portalfiscal.inf.br/nfe"
+
+# Volume de um dia típico da rede (escala 1x); a escala multiplica o número de lojas
+VOLUME_DIARIO = {"lojas": 8, "fornecedores": 12, "produtos": 25}
+
+FRUTAS = ["BANANA", "MAÇÃ", "TOMATE", "ALFACE", "UVA", "LARANJA", "PÊRA", "MAMÃO", "MANGA", "LIMÃO", "CENOURA", "BATATA",
+          "CEBOLA", "ABACAXI", "MELANCIA", "MELÃO", "PIMENTÃO", "ABOBRINHA", "BETERRABA", "CHUCHU", "REPOLHO", "COUVE"]
+VARIEDADES = ["PRATA", "NANICA", "FUJI", "GALA", "ITALIANO", "CRESPA", "AMERICANA", "NIAGARA", "THOMPSON", "PERA", "LIMA",
+              "FORMOSA", "PAPAYA", "PALMER", "TAHITI", "ASTERIX", "ROXA", "PÉROLA", "AMARELO", "VERDE", "HIDROPÔNICA"]
+TIPOS = ["", "", "KG", "CX", "BDJ", "EXTRA", "GRAÚDA", "ORGÂNICO"]
+OBSERVACOES = ["Falta de {p} por quebra no transporte", "Mercadoria sujeita a conferência", "Avaria em {p}, enviado parcial",
+               "Pedido atendido conforme disponibilidade", "Produto {p} em falta no CEASA"]
+
+class ArquivoMemoria(io.BytesIO):
+    """BytesIO com .name, no formato dos uploads do Streamlit."""
+    def __init__(self, conteudo, name):
+        super().__init__(conteudo)
+        self.name = name
+
+# ==========================================
+# CENÁRIO (catálogo, cadastros e De-Para)
+# ==========================================
+def _catalogo(rng, n_produtos):
+    nomes = set()
+    while len(nomes) < n_produtos:
+        nomes.add(" ".join(t for t in (rng.choice(FRUTAS), rng.choice(VARIEDADES), rng.choice(TIPOS)) if t))
+    return sorted(nomes)
+
+def gerar_cenario(lojas=8, fornecedores=12, produtos=25, ruido=0.3, seed=0):
+    """Cadastros coerentes entre pedido, NF-e e banco.
+
+    ruido (0-1) é a probabilidade de o nome na nota divergir do pedido (ordem, abreviação, erro de digitação).
+    """
+    rng = random.Random(seed)
+    cenario = {"ruido": ruido, "seed": seed, "lojas": [], "fornecedores": [], "mapping_forn": {}, "mapping_nome": [], "mapping_cnpj": [], "dict_depara": {}}
+
+    for i in range(1, lojas + 1):
+        sufixo = f"{i:04d}{(i * 37) % 100:02d}"
+        cenario["lojas"].append({"loja": f"Loja_{i:02d}", "numero": i, "cnpj": f"11222333{sufixo}", "nome": f"TOME LEVE SUPERMERCADOS LOJA {i}"})
+        cenario["mapping_cnpj"].append((sufixo, f"Loja_{i:02d}"))
+
+    for f in range(1, fornecedores + 1):
+        nome = f"HORTIFRUTI {rng.choice(['SOL', 'VALE', 'SERRA', 'CAMPO', 'CEASA', 'RIO'])} {f:03d}"
+        cnpj = f"{rng.randint(10_000_000, 99_999_999)}0001{rng.randint(10, 99)}"
+        itens = []
+        for cod, desc in enumerate(_catalogo(rng, produtos), start=1):
+            padrao = rng.choice([1.0, 6.0, 10.0, 12.0, 18.0, 20.0])
+            # ~30% do catálogo já tem De-Para: nota vem com a descrição do fornecedor e fator de conversão
+            fator = rng.choice([1.0, padrao]) if rng.random() < 0.3 else None
+            if fator is not None: cenario["dict_depara"][(cnpj, str(cod))] = (desc, fator)
+            itens.append({"cod": cod, "desc": desc, "padrao": padrao, "custo": round(rng.uniform(2, 90), 2), "fator": fator})
+        cenario["fornecedores"].append({"nome": nome, "macro": f"FORN_{f:03d}", "cod": f"{f:06d}", "cnpj": cnpj, "itens": itens})
+        cenario["mapping_forn"][nome] = f"FORN_{f:03d}"
+
+    # Pedido de cada loja: subconjunto do catálogo de cada fornecedor
+    cenario["pedidos"] = {}
+    for loja in cenario["lojas"]:
+        for forn in cenario["fornecedores"]:
+            escolhidos = [item for item in forn["itens"] if rng.random() < 0.7]
+            cenario["pedidos"][(loja["loja"], forn["nome"])] = [(item, rng.randint(1, 15)) for item in escolhidos]
+    return cenario
+
+def cenario_por_escala(escala, ruido=0.3, seed=0):
+    return gerar_cenario(lojas=VOLUME_DIARIO["lojas"] * escala, fornecedores=VOLUME_DIARIO["fornecedores"],
+                         produtos=VOLUME_DIARIO["produtos"], ruido=ruido, seed=seed)
+
+def referencias(cenario):
+    """(dict_depara, ResolvedorFornecedor, ResolvedorLoja) equivalentes ao que viria do banco."""
+    return cenario["dict_depara"], ResolvedorFornecedor(cenario["mapping_forn"]), ResolvedorLoja(cenario["mapping_nome"], cenario["mapping_cnpj"])
+
+# ==========================================
+# RUÍDO NOS NOMES
+# ==========================================
+def _com_ruido(nome, rng):
+    tokens = nome.split()
+    alteracao = rng.randrange(4)
+    if alteracao == 0 and len(tokens) > 1:
+        rng.shuffle(tokens)
+    elif alteracao == 1:
+        pos = rng.randrange(len(tokens))
+        if len(tokens[pos]) > 4: tokens[pos] = tokens[pos][:3] + "."
+    elif alteracao == 2:
+        pos = rng.randrange(len(tokens))
+        palavra = tokens[pos]
+        if len(palavra) > 3:
+            i = rng.randrange(1, len(palavra) - 1)
+            tokens[pos] = palavra[:i] + palavra[i + 1:]
+    else:
+        tokens.append(rng.choice(["KG", "CX", "1A", "GRANEL"]))
+    return " ".join(tokens)
+
+# ==========================================
+# NF-e (XML)
+# ==========================================
+def _xml_nfe(rng, numero, loja, forn, itens_pedido, ruido):
+    dets = []
+    for n_item, (item, qtd_cx) in enumerate(itens_pedido, start=1):
+        if rng.random() < 0.05: continue  # item não faturado
+        qtd_kg = qtd_cx * item["padrao"]
+        if rng.random() < 0.15: qtd_kg = max(qtd_kg - rng.randint(1, 5) * item["padrao"], 0.5)
+        if item["fator"] is not None:
+            x_prod, q_com = f"{item['desc'][:12]} COD{item['cod']}", qtd_kg / item["fator"]
+        else:
+            x_prod, q_com = (_com_ruido(item["desc"], rng) if rng.random() < ruido else item["desc"]), qtd_kg
+        dets.append(f'<det nItem="{n_item}"><prod><cProd>{"0" * rng.randint(0, 3)}{item["cod"]}</cProd><xProd>{x_prod}</xProd>'
+                    f'<uCom>KG</uCom><qCom>{q_com:.4f}</qCom></prod><imposto><ICMS/></imposto></det>')
+    # Item extra (não pedido) de vez em quando
+    if rng.random() < 0.2:
+        extra = rng.choice(forn["itens"])
+        dets.append(f'<det nItem="{len(itens_pedido) + 1}"><prod><cProd>9{extra["cod"]:03d}</cProd><xProd>{extra["desc"]} BONIFICACAO</xProd><qCom>{rng.randint(1, 10):.4f}</qCom></prod></det>')
+
+    inf_adic = ""
+    if rng.random() < 0.3:
+        obs = rng.choice(OBSERVACOES).format(p=rng.choice(itens_pedido)[0]["desc"] if itens_pedido else "mercadoria")
+        inf_adic = f"<infAdic><infCpl>{obs}</infCpl></infAdic>"
+    chave = f"35{rng.randint(10**41, 10**42 - 1)}"
+    return (f'<?xml version="1.0" encoding="UTF-8"?><nfeProc xmlns="{NAMESPACE_NFE}" versao="4.00"><NFe><infNFe Id="NFe{chave}" versao="4.00">'
+            f'<ide><nNF>{numero}</nNF></ide><emit><CNPJ>{forn["cnpj"]}</CNPJ><xNome>{forn["nome"]} LTDA</xNome></emit>'
+            f'<dest><CNPJ>{loja["cnpj"]}</CNPJ><xNome>{loja["nome"]}</xNome></dest>{"".join(dets)}<total/>{inf_adic}'
+            f'</infNFe><Signature/></NFe><protNFe><infProt/></protNFe></nfeProc>').encode("utf-8")
+
+def gerar_xmls(cenario, notas_por_entrega=1):
+    """NF-e de cada (loja, fornecedor) entregue, com os itens repartidos em notas_por_entrega arquivos.
+
+    ~10% dos fornecedores não entregam em cada loja.
+    """
+    rng = random.Random(cenario["seed"] + 1)
+    arquivos = []
+    for loja in cenario["lojas"]:
+        for forn in cenario["fornecedores"]:
+            itens_pedido = cenario["pedidos"][(loja["loja"], forn["nome"])]
+            if not itens_pedido or rng.random() < 0.1: continue
+            for parte in range(notas_por_entrega):
+                itens_nota = itens_pedido[parte::notas_por_entrega]
+                if not itens_nota: continue
+                numero = len(arquivos) + 1
+                arquivos.append(ArquivoMemoria(_xml_nfe(rng, numero, loja, forn, itens_nota, cenario["ruido"]), f"NFe_{numero:06d}.xml"))
+    return arquivos
+
+# ==========================================
+# PLANILHAS (pedido e matriz do comprador)
+# ==========================================
+def gerar_pedidos_xlsx(cenario):
+    """Planilha no formato lido por PedidoRepository: uma aba por loja, blocos 'Fornecedor:'."""
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+        for loja in cenario["lojas"]:
+            linhas = [["PEDIDO DE COMPRA FLV", None, None, None]]
+            for forn in cenario["fornecedores"]:
+                itens_pedido = cenario["pedidos"][(loja["loja"], forn["nome"])]
+                if not itens_pedido: continue
+                linhas.append([f"Fornecedor: {forn['nome']}", None, None, None])
+                linhas.append(["Código", "Descrição", "Qtd", "Padrão"])
+                linhas.extend([item["cod"], item["desc"], qtd_cx, item["padrao"]] for item, qtd_cx in itens_pedido)
+            pd.DataFrame(linhas).to_excel(writer, sheet_name=loja["loja"], header=False, index=False)
+    buffer.seek(0)
+    buffer.name = "Pedidos_Sinteticos.xlsx"
+    return buffer
+
+def gerar_matriz_comprador(cenario):
+    """Matriz comercial no formato do Preparador: um bloco 'PEDIDO FLV' por fornecedor, lojas em colunas."""
+    lojas = cenario["lojas"]
+    linhas = [["RESUMO DE COMPRAS FLV"]]
+    for forn in cenario["fornecedores"]:
+        linhas.append([f"PEDIDO FLV {forn['nome']}"])
+        linhas.append(["CÓD. FORN", forn["cod"]])
+        linhas.append(["CÓD", "DESCRIÇÃO", "PADRÃO CX", "CUSTO", "ESTOQUE", "MÉDIA"] + [f"L{loja['numero']:02d}" for loja in lojas])
+        qtds = [{item["cod"]: q for item, q in cenario["pedidos"][(loja["loja"], forn["nome"])]} for loja in lojas]
+        for item in forn["itens"]:
+            linhas.append([item["cod"], item["desc"], f"{item['padrao']:g} KG", f"R$ {item['custo']:.2f}".replace(".", ","), 0, 0] + [q.get(item["cod"]) for q in qtds])
+        linhas.append(["TOTAL"])
+    buffer = io.BytesIO()
+    pd.DataFrame(linhas).to_excel(buffer, sheet_name="MATRIZ", header=False, index=False)
+    buffer.seek(0)
+    buffer.name = "Matriz_Comprador.xlsx"
+    return buffer
+
+def gerar_contagens_doca(cenario, turnos=2, formato="xlsx"):
+    """Contagem física no formato devolvido pela Doca: um arquivo por loja e turno, itens repartidos entre os turnos."""
+    rng = random.Random(cenario["seed"] + 2)
+    arquivos = []
+    for loja in cenario["lojas"]:
+        linhas_turno = [[] for _ in range(turnos)]
+        for forn in cenario["fornecedores"]:
+            for item, qtd_cx in cenario["pedidos"][(loja["loja"], forn["nome"])]:
+                if rng.random() < 0.1: continue  # não contado
+                contado = qtd_cx if rng.random() < 0.8 else max(qtd_cx - rng.randint(1, 3), 0)
+                linhas_turno[rng.randrange(turnos)].append([item["cod"], item["desc"], qtd_cx, f"{item['padrao']:g}", contado])
+        for turno, linhas in enumerate(linhas_turno, start=1):
+            df = pd.DataFrame([[f"CONFERÊNCIA DOCA - LOJA {loja['numero']}", None, None, None, f"Turno {turno}"],
+                               ["Código", "Descrição", "Qtd_Pedida", "Padrão_Cx", "Qtd_Contada"]] + linhas)
+            buffer = io.BytesIO()
+            if formato == "csv": df.to_csv(buffer, sep=";", header=False, index=False)
+            else: df.to_excel(buffer, sheet_name=loja["loja"], header=False, index=False)
+            arquivos.append(ArquivoMemoria(buffer.getvalue(), f"{loja['loja']}_turno{turno}.{formato}"))
+    return arquivos
+
+def escrever_cenario(cenario, diretorio, notas_por_entrega=1):
+    os.makedirs(os.path.join(diretorio, "notas"), exist_ok=True)
+    for arquivo in gerar_xmls(cenario, notas_por_entrega):
+        with open(os.path.join(diretorio, "notas", arquivo.name), "wb") as f: f.write(arquivo.getvalue())
+    with open(os.path.join(diretorio, "Pedidos.xlsx"), "wb") as f: f.write(gerar_pedidos_xlsx(cenario).getvalue())
+    with open(os.path.join(diretorio, "Matriz_Comprador.xlsx"), "wb") as f: f.write(gerar_matriz_comprador(cenario).getvalue())
+    os.makedirs(os.path.join(diretorio, "doca"), exist_ok=True)
+    for arquivo in gerar_contagens_doca(cenario):
+        with open(os.path.join(diretorio, "doca", arquivo.name), "wb") as f: f.write(arquivo.getvalue())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera um cenário sintético (NF-e, pedidos e matriz) em disco.")
+    parser.add_argument("--saida", required=True)
+    parser.add_argument("--escala", type=int, default=1, help="Multiplica o número de lojas do volume diário")
+    parser.add_argument("--lojas", type=int)
+    parser.add_argument("--fornecedores", type=int, default=VOLUME_DIARIO["fornecedores"])
+    parser.add_argument("--produtos", type=int, default=VOLUME_DIARIO["produtos"])
+    parser.add_argument("--ruido", type=float, default=0.3, help="Probabilidade de o nome na nota divergir do pedido (0-1)")
+    parser.add_argument("--notas-por-entrega", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    cenario = gerar_cenario(lojas=args.lojas or VOLUME_DIARIO["lojas"] * args.escala, fornecedores=args.fornecedores,
+                            produtos=args.produtos, ruido=args.ruido, seed=args.seed)
+    escrever_cenario(cenario, args.saida, args.notas_por_entrega)
@@ -0,0 +1,119 @@
+import importlib.util
+import logging
+import os
+import shutil
+import uuid
+from datetime import datetime
+from urllib.parse import unquote
+
+import numpy as np
+import pandas as pd
+
+from armazem_nfe import FUSO_BR
+
+logger = logging.getLogger("FLV_Enterprise")
+
+# ==========================================
+# HISTÓRICO DAS AUDITORIAS (Parquet + resumos para o Dashboard)
+# ==========================================
+DIR_HISTORICO = "historico"
+TEM_PARQUET = importlib.util.find_spec("pyarrow") is not None
+
+TABELA_HISTORICO = "auditoria_historico"
+TABELA_RESUMO_FORNECEDOR = "auditoria_resumo_fornecedor"
+TABELA_RESUMO_LOJA = "auditoria_resumo_loja"
+
+COLUNAS_HISTORICO = ["data_auditoria", "execucao", "loja", "fornecedor", "produto_pedido", "produto_xml", "qtd_pedido", "qtd_nota", "origem_match",
+                     "diferenca", "status_visual", "status_codigo", "justificativa_ia", "qtd_fisico", "padrao_fisico", "status_doca", "diferenca_doca"]
+METRICAS_RESUMO = ["linhas", "itens_pedidos", "itens_ok", "itens_falta", "itens_sobra", "itens_extra", "itens_sem_nota", "itens_justificados", "itens_doca_divergente",
+                   "qtd_pedida", "qtd_faturada", "falta_kg", "sobra_kg", "taxa_falta"]
+
+# status_codigo de AuditoriaService._classificar / _registrar_extras
+CODIGO_OK, CODIGO_FALTA, CODIGO_SOBRA, CODIGO_EXTRA = 0, -1, 1, 2
+CODIGOS_SEM_NOTA = (98, 99)
+TOLERANCIA_DOCA = 0.001
+
+def nova_execucao():
+    return f"{datetime.now(FUSO_BR):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+
+def _numero(serie):
+    # qtd_fisico/padrao_fisico usam "-" quando a Doca não contou o item
+    return pd.to_numeric(serie.where(serie != "-"), errors="coerce").astype(float)
+
+def preparar_historico(df_final, data_auditoria, execucao):
+    """Resultado da auditoria com tipos fixos (numéricos sem "-") e as colunas de partição na frente."""
+    df = df_final.assign(data_auditoria=data_auditoria, execucao=execucao,
+                         qtd_fisico=_numero(df_final["qtd_fisico"]), padrao_fisico=_numero(df_final["padrao_fisico"]))
+    return df[COLUNAS_HISTORICO].astype({"loja": str, "status_codigo": "int16"})
+
+def resumir(df_historico, chaves):
+    """Um registro por (data_auditoria, execucao, *chaves): contagens por status, quilos e taxa de falta.
+
+    itens_pedidos acompanha a taxa para que o Dashboard some lojas e recalcule a taxa do total.
+    """
+    codigo, diferenca = df_historico["status_codigo"].to_numpy(), df_historico["diferenca"].to_numpy()
+    falta = codigo == CODIGO_FALTA
+    sobra = np.isin(codigo, (CODIGO_SOBRA, CODIGO_EXTRA))
+    sem_nota = np.isin(codigo, CODIGOS_SEM_NOTA)
+    contado = df_historico["qtd_fisico"].notna().to_numpy()
+    marcadores = pd.DataFrame({
+        "data_auditoria": df_historico["data_auditoria"].to_numpy(), "execucao": df_historico["execucao"].to_numpy(),
+        **{chave: df_historico[chave].astype(str).to_numpy() for chave in chaves},
+        "itens_ok": codigo == CODIGO_OK, "itens_falta": falta, "itens_sobra": codigo == CODIGO_SOBRA, "itens_extra": codigo == CODIGO_EXTRA,
+        "itens_sem_nota": sem_nota, "itens_justificados": df_historico["status_visual"].astype(str).str.startswith("🤖").to_numpy(),
+        "itens_doca_divergente": contado & (np.abs(df_historico["diferenca_doca"].to_numpy(dtype=float)) >= TOLERANCIA_DOCA),
+        "qtd_pedida": df_historico["qtd_pedido"].to_numpy(dtype=float), "qtd_faturada": df_historico["qtd_nota"].to_numpy(dtype=float),
+        "falta_kg": np.where(falta | sem_nota, -diferenca, 0.0), "sobra_kg": np.where(sobra, diferenca, 0.0),
+        "itens_pedidos": codigo != CODIGO_EXTRA, "linhas": 1})
+    resumo = marcadores.groupby(["data_auditoria", "execucao", *chaves], as_index=False, sort=True).sum()
+    # Taxa de falta: itens pedidos que faltaram ou não vieram na nota
+    resumo["taxa_falta"] = ((resumo["itens_falta"] + resumo["itens_sem_nota"]) / resumo["itens_pedidos"].where(lambda n: n > 0)).fillna(0.0).round(4)
+    return resumo[["data_auditoria", "execucao", *chaves] + METRICAS_RESUMO]
+
+def montar_historico(df_final, data_auditoria, execucao=None, lojas=None):
+    """{tabela: DataFrame} com o resultado bruto e os resumos por fornecedor e por loja.
+
+    Tudo tem loja: cada auditoria pode cobrir só parte das lojas e substitui apenas as que auditou.
+    lojas = lojas do arquivo de pedidos; linhas de outras lojas (só notas extras) não entram nem apagam nada.
+    """
+    if lojas is not None: df_final = df_final[df_final["loja"].astype(str).isin([str(loja) for loja in lojas])]
+    df_historico = preparar_historico(df_final, data_auditoria, execucao or nova_execucao())
+    return {TABELA_HISTORICO: df_historico,
+            TABELA_RESUMO_FORNECEDOR: resumir(df_historico, ["loja", "fornecedor"]),
+            TABELA_RESUMO_LOJA: resumir(df_historico, ["loja"])}
+
+def pares_data_loja(df):
+    """{data_auditoria: [lojas]} cobertos por uma tabela do histórico."""
+    pares = df[["data_auditoria", "loja"]].astype(str).drop_duplicates()
+    return {data: sorted(lojas) for data, lojas in pares.groupby("data_auditoria")["loja"]}
+
+def _remover_particoes(destino, pares):
+    # Nomes de partição vêm codificados (loja=Loja%20Centro): compara pelo valor decodificado
+    for data_auditoria, lojas in pares.items():
+        pasta_data = os.path.join(destino, f"data_auditoria={data_auditoria}")
+        if not os.path.isdir(pasta_data): continue
+        for entrada in os.listdir(pasta_data):
+            if entrada.startswith("loja=") and unquote(entrada[len("loja="):]) in lojas:
+                shutil.rmtree(os.path.join(pasta_data, entrada), ignore_errors=True)
+
+def gravar_parquet(tabelas, diretorio=DIR_HISTORICO):
+    """historico/<tabela>/data_auditoria=AAAA-MM-DD/loja=.../<execucao>-N.parquet.
+
+    Só as partições (data, loja) presentes são substituídas: auditorias de outras lojas no mesmo dia são mantidas.
+    """
+    if not TEM_PARQUET:
+        logger.warning("pyarrow não instalado: histórico em Parquet não gravado.")
+        return False
+    for tabela, df in tabelas.items():
+        if df.empty: continue
+        destino = os.path.join(diretorio, tabela)
+        _remover_particoes(destino, pares_data_loja(df))
+        df.to_parquet(destino, partition_cols=["data_auditoria", "loja"], index=False, basename_template=f"{df['execucao'].iat[0]}-{{i}}.parquet")
+    return True
+
+def ler_historico(tabela=TABELA_RESUMO_FORNECEDOR, diretorio=DIR_HISTORICO, desde=None):
+    """Lê um dos conjuntos gravados; `desde` (AAAA-MM-DD) poda as partições de data antes de ler."""
+    caminho = os.path.join(diretorio, tabela)
+    if not TEM_PARQUET or not os.path.isdir(caminho): return pd.DataFrame()
+    filtros = [("data_auditoria", ">=", desde)] if desde else None
+    return pd.read_parquet(caminho, filters=filtros)
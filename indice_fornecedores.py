@@ -0,0 +1,90 @@
+from collections import Counter, defaultdict
+
+import pandas as pd
+from rapidfuzz import fuzz
+
+from motor_fuzzy import ordenar_tokens
+
+# ==========================================
+# ÍNDICE DE SOBRAS ENTRE FORNECEDORES (pós-cruzamento)
+# ==========================================
+TAMANHO_NGRAMA = 3
+# Só os mais parecidos pelo n-grama vão para o fuzzy: custo por sobra do pedido fica limitado
+MAX_CANDIDATOS = 20
+MIN_ITENS_SUGESTAO = 2
+MAX_EXEMPLOS = 3
+
+COLUNAS_SUGESTOES = ["nome_original", "nome_macro", "fornecedor_pedido", "itens", "lojas", "score_medio", "exemplos"]
+
+def ngramas(texto, n=TAMANHO_NGRAMA):
+    # Por palavra, com bordas: "KG" ainda gera n-gramas e typos só afetam os n-gramas vizinhos
+    return {f" {token} "[i:i + n] for token in texto.split() for i in range(len(token) + 3 - n)}
+
+class IndiceSobras:
+    """n-grama -> notas sem pedido de uma loja, de qualquer Fornecedor_Macro.
+
+    Cada produto do pedido que sobrou só é pontuado contra as notas com mais n-gramas em comum.
+    """
+    def __init__(self, produtos):
+        self.produtos = ordenar_tokens(produtos)
+        self._postagens = defaultdict(list)
+        for pos, texto in enumerate(self.produtos):
+            for ngrama in ngramas(texto): self._postagens[ngrama].append(pos)
+
+    def candidatos(self, texto):
+        comuns = Counter()
+        for ngrama in ngramas(texto): comuns.update(self._postagens.get(ngrama, ()))
+        return [pos for pos, _ in comuns.most_common(MAX_CANDIDATOS)]
+
+def repareamentos(sobras_pedido, sobras_nota, limiar):
+    """Pares (pedido, nota) de fornecedores diferentes na mesma loja, maior score primeiro e sem reutilizar nota.
+
+    sobras_pedido = [(loja, fornecedor_original, fornecedor_macro, produto)]; sobras_nota = [(loja, fornecedor_macro, produto)].
+    Retorna (pares, comparacoes) com pares = [(score, i_pedido, j_nota)].
+    """
+    notas_por_loja = defaultdict(list)
+    for j, (loja, _, _) in enumerate(sobras_nota): notas_por_loja[loja].append(j)
+    pedidos_por_loja = defaultdict(list)
+    for i, (loja, _, _, _) in enumerate(sobras_pedido):
+        if loja in notas_por_loja: pedidos_por_loja[loja].append(i)
+
+    pares, comparacoes = [], 0
+    for loja, posicoes_ped in pedidos_por_loja.items():
+        posicoes_nota = notas_por_loja[loja]
+        indice = IndiceSobras([sobras_nota[j][2] for j in posicoes_nota])
+        candidatos = []
+        for i in posicoes_ped:
+            texto = ordenar_tokens([sobras_pedido[i][3]])[0]
+            for pos in indice.candidatos(texto):
+                comparacoes += 1
+                score = fuzz.ratio(texto, indice.produtos[pos], score_cutoff=limiar)
+                if score: candidatos.append((score, i, posicoes_nota[pos]))
+
+        # Atribuição gulosa, como MotorFuzzy.parear
+        candidatos.sort(key=lambda par: -par[0])
+        usados_ped, usados_nota = set(), set()
+        for score, i, j in candidatos:
+            if i in usados_ped or j in usados_nota: continue
+            usados_ped.add(i); usados_nota.add(j)
+            pares.append((score, i, j))
+    return pares, comparacoes
+
+def sugerir_alias_fornecedor(sobras_pedido, sobras_nota, limiar, min_itens=MIN_ITENS_SUGESTAO):
+    """Agrupa os repareamentos por (fornecedor da nota, fornecedor do pedido) no formato de fornecedores_mapeamento.
+
+    Retorna (DataFrame COLUNAS_SUGESTOES, repareamentos, comparacoes); produto coincidente isolado (< min_itens) fica de fora.
+    """
+    pares, comparacoes = repareamentos(sobras_pedido, sobras_nota, limiar)
+    grupos = {}
+    for score, i, j in pares:
+        loja, forn_original, forn_macro, prod_ped = sobras_pedido[i]
+        _, macro_nota, prod_nota = sobras_nota[j]
+        grupo = grupos.setdefault((macro_nota, forn_macro), {"fornecedor": forn_original, "lojas": set(), "scores": [], "exemplos": []})
+        grupo["lojas"].add(loja)
+        grupo["scores"].append(score)
+        if len(grupo["exemplos"]) < MAX_EXEMPLOS: grupo["exemplos"].append(f"{prod_ped} ↔ {prod_nota}")
+
+    linhas = [(macro_nota, forn_macro, g["fornecedor"], len(g["scores"]), len(g["lojas"]), round(sum(g["scores"]) / len(g["scores"]), 1), "; ".join(g["exemplos"]))
+              for (macro_nota, forn_macro), g in grupos.items() if len(g["scores"]) >= min_itens]
+    df = pd.DataFrame(linhas, columns=COLUNAS_SUGESTOES)
+    return df.sort_values(["itens", "score_medio"], ascending=False, kind="stable", ignore_index=True), len(pares), comparacoes
@@ -0,0 +1,271 @@
+import io
+import logging
+import os
+import xml.etree.ElementTree as ET
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from cache_entradas import conteudo
+from normalizacao import normalizar_serie
+
+logger = logging.getLogger("FLV_Enterprise")
+
+NAMESPACE_NFE = {'nfe': 'http://www.portalfiscal.inf.br/nfe'}
+_NS = '{%s}' % NAMESPACE_NFE['nfe']
+
+TAG_INF_NFE = _NS + 'infNFe'
+TAG_EMIT, TAG_DEST, TAG_DET, TAG_INF_ADIC = _NS + 'emit', _NS + 'dest', _NS + 'det', _NS + 'infAdic'
+TAG_PROD, TAG_XPROD, TAG_CPROD, TAG_QCOM = _NS + 'prod', _NS + 'xProd', _NS + 'cProd', _NS + 'qCom'
+TAG_XNOME, TAG_CNPJ, TAG_INF_CPL = _NS + 'xNome', _NS + 'CNPJ', _NS + 'infCpl'
+
+_TAGS_ALVO = frozenset((TAG_INF_NFE, TAG_EMIT, TAG_DEST, TAG_DET, TAG_INF_ADIC))
+
+COLUNAS_NOTAS = ["Loja", "Fornecedor_Macro", "Produto", "Qtd", "Origem", "Chave_Item"]
+ORIGEM_MEMORIA = "Memória 🧠"
+
+# Abaixo deste volume o custo de subir o pool supera o ganho
+LIMIAR_PARALELO = 64
+
+# Lotes enviados ao pool: fecham no que vier primeiro; só LOTES_EM_VOO_POR_PROCESSO ficam em memória por processo
+ARQUIVOS_POR_LOTE = 32
+BYTES_POR_LOTE = 4 * 1024 * 1024
+LOTES_EM_VOO_POR_PROCESSO = 2
+
+# ==========================================
+# LEITURA STREAMING (iterparse)
+# ==========================================
+def _filhos(elem, *tags):
+    # Uma única passada pelos filhos diretos, sem find() com namespace
+    achados = dict.fromkeys(tags)
+    for filho in elem:
+        if filho.tag in achados and achados[filho.tag] is None: achados[filho.tag] = filho
+    return [achados[t] for t in tags]
+
+def ler_nfe_streaming(fonte):
+    """Extrai só os campos usados na auditoria, liberando cada bloco assim que é lido.
+
+    Retorna (cabecalho, itens) ou (None, []) se o documento não tiver infNFe.
+    """
+    cabecalho = {"chave": "", "emit_nome": None, "emit_cnpj": None, "dest_cnpj": "0", "dest_nome": None, "infcpl": None}
+    itens = []
+
+    for _, elem in ET.iterparse(fonte, events=("end",)):
+        tag = elem.tag
+        if tag not in _TAGS_ALVO: continue
+
+        if tag == TAG_DET:
+            prod = _filhos(elem, TAG_PROD)[0]
+            if prod is not None:
+                x_prod, c_prod, q_com = _filhos(prod, TAG_XPROD, TAG_CPROD, TAG_QCOM)
+                if x_prod is not None and q_com is not None:
+                    itens.append((x_prod.text, c_prod.text.strip() if c_prod is not None else "", q_com.text))
+        elif tag == TAG_INF_NFE:
+            cabecalho["chave"] = elem.get("Id", "")
+            return cabecalho, itens  # assinatura e protocolo não interessam
+        elif tag == TAG_INF_ADIC:
+            inf_cpl = _filhos(elem, TAG_INF_CPL)[0]
+            cabecalho["infcpl"] = inf_cpl.text if inf_cpl is not None else None
+        else:
+            x_nome, cnpj = _filhos(elem, TAG_XNOME, TAG_CNPJ)
+            prefixo = "emit" if tag == TAG_EMIT else "dest"
+            if x_nome is not None: cabecalho[f"{prefixo}_nome"] = x_nome.text
+            if cnpj is not None: cabecalho[f"{prefixo}_cnpj"] = cnpj.text
+        elem.clear()
+
+    return None, []
+
+# ==========================================
+# ENTRADAS: XMLs avulsos ou ZIPs (membros descompactados um a um)
+# ==========================================
+# Membro danificado (CRC, stream zlib truncado, criptografado, compressão sem suporte): só ele é descartado
+ERROS_MEMBRO_ZIP = (zipfile.BadZipFile, zlib.error, EOFError, RuntimeError, NotImplementedError)
+
+def eh_zip(nome):
+    return nome.lower().endswith(".zip")
+
+def _descartar_membro(nome, erro):
+    logger.error(f"Membro de ZIP ilegível ou corrompido descartado ({nome}). {erro}")
+
+def iterar_fontes(arquivos_xml):
+    """(nome, fonte) por XML, na ordem de upload. Uploads avulsos viram bytes; membros .xml de ZIPs
+    (pastas internas incluídas) são arquivos abertos sob demanda, válidos só até o próximo item.
+    """
+    for i, arquivo in enumerate(arquivos_xml or []):
+        nome = getattr(arquivo, "name", str(i))
+        if not eh_zip(nome):
+            yield nome, conteudo(arquivo)
+            continue
+        try:
+            with zipfile.ZipFile(arquivo) as zf:
+                for info in zf.infolist():
+                    if info.is_dir() or not info.filename.lower().endswith(".xml"): continue
+                    nome_membro = f"{nome}/{info.filename}"
+                    try: membro = zf.open(info)
+                    except ERROS_MEMBRO_ZIP as e:
+                        _descartar_membro(nome_membro, e)
+                        continue
+                    with membro: yield nome_membro, membro
+        except zipfile.BadZipFile as e:
+            logger.error(f"ZIP inválido ou corrompido descartado ({nome}). {e}")
+
+def lotes_de_conteudo(arquivos_xml, max_arquivos=ARQUIVOS_POR_LOTE, max_bytes=BYTES_POR_LOTE):
+    """Gera listas [(nome, bytes)] limitadas em arquivos e bytes: só o lote corrente é materializado."""
+    lote, peso = [], 0
+    for nome, fonte in iterar_fontes(arquivos_xml):
+        try: dados = fonte if isinstance(fonte, bytes) else fonte.read()
+        except ERROS_MEMBRO_ZIP as e:
+            _descartar_membro(nome, e)
+            continue
+        lote.append((nome, dados)); peso += len(dados)
+        if len(lote) >= max_arquivos or peso >= max_bytes:
+            yield lote
+            lote, peso = [], 0
+    if lote: yield lote
+
+# ==========================================
+# WORKERS (contexto enviado uma única vez por processo)
+# ==========================================
+_CONTEXTO = {}
+
+def _inicializar_worker(dict_depara, resolvedor_forn, resolvedor_loja, memoria_match=None):
+    _CONTEXTO.update(dict_depara=dict_depara, resolvedor_forn=resolvedor_forn, resolvedor_loja=resolvedor_loja, memoria_match=memoria_match)
+
+def _novas_colunas():
+    return {col: [] for col in COLUNAS_NOTAS}
+
+def _ler_documento(nome_arquivo, fonte):
+    try:
+        cabecalho, itens = ler_nfe_streaming(io.BytesIO(fonte) if isinstance(fonte, bytes) else fonte)
+    except ET.ParseError as e:
+        logger.error(f"Falha de integridade. XML inválido ou corrompido descartado ({nome_arquivo}). {e}")
+        return None
+    except ERROS_MEMBRO_ZIP as e:
+        # Membro de ZIP lido direto pelo iterparse: a falha de descompactação só aparece aqui
+        _descartar_membro(nome_arquivo, e)
+        return None
+    return (cabecalho, itens) if cabecalho is not None else None
+
+def ler_lote_bruto(lote):
+    """Só o parse, sem De-Para nem cadastros: [(nome, cabecalho, itens)] alinhado ao lote, None nos inválidos."""
+    documentos = []
+    for nome_arquivo, fonte in lote:
+        documento = _ler_documento(nome_arquivo, fonte)
+        documentos.append(None if documento is None else (nome_arquivo, *documento))
+    return documentos
+
+def chave_item(cnpj_limpo, cod_limpo, x_prod):
+    # cProd identifica o item no fornecedor; sem ele, o próprio xProd
+    return f"{cnpj_limpo}|{cod_limpo}" if cod_limpo else f"{cnpj_limpo}|#{(x_prod or '').strip().upper()}"
+
+def resolver_documentos(documentos, dict_depara, resolvedor_forn, resolvedor_loja, memoria_match=None):
+    """Aplica cadastros, De-Para e memória de matches a [(nome, cabecalho, itens)] já parseados. Devolve (colunas, textos_infcpl).
+
+    memoria_match ({chave_item: descrição interna}) só é consultada quando o De-Para não tem o item.
+    """
+    colunas, textos_infcpl = _novas_colunas(), {}
+    memoria_match = memoria_match or {}
+
+    for documento in documentos:
+        if documento is None: continue
+        _, cabecalho, itens = documento
+        forn_macro = resolvedor_forn.resolver(cabecalho["emit_nome"] or "")
+        cnpj_forn_limpo = ''.join(filter(str.isdigit, (cabecalho["emit_cnpj"] or "").strip()))
+        loja_xml = resolvedor_loja.resolver(cabecalho["dest_cnpj"], cabecalho["dest_nome"] or "")
+
+        if cabecalho["infcpl"]:
+            textos_infcpl[(loja_xml, forn_macro)] = cabecalho["infcpl"]
+
+        if loja_xml == "Loja_Desconhecida" and itens:
+            logger.warning(f"XML Órfão Detectado: CNPJ Destino='{cabecalho['dest_cnpj']}', Nome Destino='{cabecalho['dest_nome']}'")
+
+        for x_prod, cod_xml, q_com in itens:
+            qtd_xml = float(q_com)
+            cod_xml_limpo = cod_xml.lstrip('0')
+
+            if x_prod and "UVA" in x_prod.upper():
+                logger.info(f"Monitoramento UVA: Produto='{x_prod}', CNPJ='{cnpj_forn_limpo}', COD='{cod_xml_limpo}', Loja={loja_xml}")
+
+            depara = dict_depara.get((cnpj_forn_limpo, cod_xml_limpo))
+            item = chave_item(cnpj_forn_limpo, cod_xml_limpo, x_prod)
+            if depara is not None:
+                desc_interna, fator = depara
+                nome_bruto, qtd_final, origem_match = desc_interna, qtd_xml * fator, "De-Para ⚡"
+            elif item in memoria_match:
+                nome_bruto, qtd_final, origem_match = memoria_match[item], qtd_xml, ORIGEM_MEMORIA
+            else:
+                nome_bruto, qtd_final, origem_match = x_prod, qtd_xml, "XML (Fuzzy)"
+
+            colunas["Loja"].append(loja_xml)
+            colunas["Fornecedor_Macro"].append(forn_macro)
+            colunas["Produto"].append(nome_bruto)
+            colunas["Qtd"].append(qtd_final)
+            colunas["Origem"].append(origem_match)
+            colunas["Chave_Item"].append(item)
+
+    # Normalização em lote: cada nome distinto do lote passa uma vez pelo NFKD/regex
+    colunas["Produto"] = normalizar_serie(colunas["Produto"]).tolist()
+    return colunas, textos_infcpl
+
+def processar_lote(lote):
+    """Processa uma lista de (nome, bytes) e devolve (colunas, textos_infcpl)."""
+    return resolver_documentos(ler_lote_bruto(lote), _CONTEXTO["dict_depara"], _CONTEXTO["resolvedor_forn"], _CONTEXTO["resolvedor_loja"], _CONTEXTO["memoria_match"])
+
+# ==========================================
+# ORQUESTRAÇÃO
+# ==========================================
+def _mapear_limitado(pool, funcao, tarefas, em_voo):
+    # pool.map consome toda a entrada de uma vez; aqui a próxima tarefa só é lida quando há vaga, e a saída segue a ordem
+    pendentes = deque()
+    for tarefa in tarefas:
+        pendentes.append(pool.submit(funcao, tarefa))
+        if len(pendentes) >= em_voo: yield pendentes.popleft().result()
+    while pendentes: yield pendentes.popleft().result()
+
+def _iniciar_lotes(lotes, max_workers):
+    """Lê lotes até saber se o volume justifica o pool. Retorna (lotes já lidos, se vale paralelizar)."""
+    lidos, n_arquivos = [], 0
+    if max_workers == 1: return lidos, False
+    for lote in lotes:
+        lidos.append(lote); n_arquivos += len(lote)
+        if n_arquivos >= LIMIAR_PARALELO: return lidos, True
+    return lidos, False
+
+def ler_documentos(arquivos, max_workers=None):
+    """Parse (sem resolução) de [(nome, bytes)], em pool quando o volume compensa; alinhado à entrada, como ler_lote_bruto."""
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers == 1 or len(arquivos) < LIMIAR_PARALELO: return ler_lote_bruto(arquivos)
+    documentos = []
+    lotes = (arquivos[inicio:inicio + ARQUIVOS_POR_LOTE] for inicio in range(0, len(arquivos), ARQUIVOS_POR_LOTE))
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        for documentos_lote in _mapear_limitado(pool, ler_lote_bruto, lotes, max_workers * LOTES_EM_VOO_POR_PROCESSO):
+            documentos.extend(documentos_lote)
+    return documentos
+
+def extrair_notas(arquivos_xml, dict_depara, resolvedor_forn, resolvedor_loja, max_workers=None, memoria_match=None):
+    """Ingestão streaming de NF-e (XMLs e ZIPs), distribuída num pool de processos quando o volume compensa.
+
+    A memória de pico fica limitada aos lotes em voo, não ao total descompactado.
+    Retorna (colunas, textos_infcpl) com as colunas em listas paralelas (COLUNAS_NOTAS).
+    """
+    contexto = (dict_depara, resolvedor_forn, resolvedor_loja, memoria_match)
+    max_workers = max_workers or os.cpu_count() or 1
+    lotes = lotes_de_conteudo(arquivos_xml)
+    lidos, paralelo = _iniciar_lotes(lotes, max_workers)
+
+    if not paralelo:
+        _inicializar_worker(*contexto)
+        if lidos: return processar_lote([arquivo for lote in lidos for arquivo in lote])
+        # Serial: cada membro de ZIP vai direto do descompactador para o iterparse
+        return resolver_documentos(((nome, *documento) for nome, fonte in iterar_fontes(arquivos_xml)
+                                    if (documento := _ler_documento(nome, fonte)) is not None), *contexto)
+
+    colunas, textos_infcpl = _novas_colunas(), {}
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_inicializar_worker, initargs=contexto) as pool:
+        # Saída na ordem dos lotes: a fusão é determinística e o último infCpl prevalece, como no laço serial
+        tarefas = (lote for fonte in (lidos, lotes) for lote in fonte)
+        for cols_lote, textos_lote in _mapear_limitado(pool, processar_lote, tarefas, max_workers * LOTES_EM_VOO_POR_PROCESSO):
+            for col in COLUNAS_NOTAS: colunas[col].extend(cols_lote[col])
+            textos_infcpl.update(textos_lote)
+    return colunas, textos_infcpl
@@ -0,0 +1,130 @@
+import json
+import logging
+import os
+import threading
+from datetime import date
+
+import pandas as pd
+
+from ingestao_nfe import ORIGEM_MEMORIA
+
+logger = logging.getLogger("FLV_Enterprise")
+
+CAMINHO_MEMORIA = os.path.join(".cache", "memoria_match.json")
+
+# Só pares fuzzy quase idênticos e com quantidade batendo (🟢 OK) viram memória
+LIMIAR_MEMORIA = 95
+
+COLUNAS_CANDIDATOS = ["cnpj_fornecedor", "cod_produto_xml", "descricao_interna", "fator_conversao", "acertos", "score", "fornecedor", "produto_xml"]
+
+# ==========================================
+# MEMÓRIA DE MATCHES FUZZY CONFIRMADOS
+# ==========================================
+class MemoriaMatch:
+    """chave_item (CNPJ do emitente + cProd, ou xProd sem cProd) -> descrição interna, aprendida dos pares fuzzy confirmados.
+
+    Consultada logo depois do De-Para na ingestão: o item chega com o nome do pedido e casa na FASE 1, sem fuzzy.
+    `revisao` só muda quando um mapeamento muda (acertos não contam) e entra na chave do cache de parse.
+    """
+    def __init__(self, caminho=CAMINHO_MEMORIA, limiar=LIMIAR_MEMORIA):
+        self.caminho = caminho
+        self.limiar = limiar
+        self.revisao = 0
+        self._itens = {}
+        self._mapa = None
+        self._lock = threading.Lock()
+        if caminho and os.path.exists(caminho):
+            try:
+                with open(caminho, encoding="utf-8") as f: dados = json.load(f)
+                self.revisao, self._itens = dados.get("revisao", 0), dados.get("itens", {})
+            except (OSError, ValueError) as e:
+                logger.warning(f"Memória de matches ilegível, recomeçando do zero: {e}")
+
+    def mapa(self):
+        """{chave_item: descrição}: snapshot enviado aos workers da ingestão, refeito só quando a revisão muda."""
+        with self._lock:
+            if self._mapa is None: self._mapa = {chave: item["descricao"] for chave, item in self._itens.items()}
+            return self._mapa
+
+    def aprender(self, pares_fuzzy, df_notas):
+        """pares_fuzzy = [(loja, fornecedor_macro, produto_nota, produto_pedido, score)] com quantidade OK.
+
+        Cada par vale para todos os itens brutos (chave_item) que formaram aquela linha de nota. Retorna quantos mapeamentos mudaram.
+        """
+        confirmados = {(loja, forn, prod_xml): (prod_ped, score) for loja, forn, prod_xml, prod_ped, score in pares_fuzzy if score >= self.limiar}
+        if not confirmados or df_notas.empty: return 0
+        fuzzy = df_notas[df_notas["Origem"] == "XML (Fuzzy)"]
+        hoje, alterados = date.today().isoformat(), 0
+
+        with self._lock:
+            for loja, forn, prod_xml, chave in zip(fuzzy["Loja"], fuzzy["Fornecedor_Macro"], fuzzy["Produto"], fuzzy["Chave_Item"]):
+                par = confirmados.get((loja, forn, prod_xml))
+                if par is None: continue
+                prod_ped, score = par
+                atual = self._itens.get(chave)
+                if atual is not None and atual["descricao"] == prod_ped:
+                    atual["score"] = max(atual["score"], score)
+                    continue
+                if atual is not None: logger.info(f"Memória de matches: '{chave}' passa de '{atual['descricao']}' para '{prod_ped}'.")
+                self._itens[chave] = {"descricao": prod_ped, "fornecedor": forn, "produto_xml": prod_xml, "score": score,
+                                      "acertos": 0, "aprendido_em": hoje, "usado_em": None}
+                alterados += 1
+            if alterados:
+                self.revisao += 1
+                self._mapa = None
+        return alterados
+
+    def registrar_acertos(self, chaves):
+        """Conta cada linha de nota resolvida pela memória (chaves = coluna Chave_Item). Retorna o total."""
+        hoje, total = date.today().isoformat(), 0
+        with self._lock:
+            for chave, n in pd.Series(chaves, dtype=object).value_counts().items():
+                item = self._itens.get(chave)
+                if item is None: continue
+                item["acertos"] += int(n)
+                item["usado_em"] = hoje
+                total += int(n)
+        return total
+
+    def acertos_em(self, df_notas):
+        if df_notas.empty: return 0
+        return self.registrar_acertos(df_notas.loc[df_notas["Origem"] == ORIGEM_MEMORIA, "Chave_Item"])
+
+    def candidatos_depara(self, dict_depara=None, min_acertos=0):
+        """Entradas com cProd no formato de depara_flv (fator 1), mais usadas primeiro, para revisão e carga no banco.
+
+        Itens que o De-Para já cobre ficam de fora.
+        """
+        dict_depara = dict_depara or {}
+        linhas = []
+        with self._lock:
+            for chave, item in self._itens.items():
+                cnpj, cod = chave.split("|", 1)
+                if cod.startswith("#") or (cnpj, cod) in dict_depara or item["acertos"] < min_acertos: continue
+                linhas.append((cnpj, cod, item["descricao"], 1.0, item["acertos"], item["score"], item["fornecedor"], item["produto_xml"]))
+        df = pd.DataFrame(linhas, columns=COLUNAS_CANDIDATOS)
+        return df.sort_values(["acertos", "score"], ascending=False, kind="stable", ignore_index=True)
+
+    def persistir(self):
+        if not self.caminho: return
+        with self._lock: conteudo = json.dumps({"revisao": self.revisao, "itens": self._itens}, ensure_ascii=False)
+        try:
+            os.makedirs(os.path.dirname(self.caminho) or ".", exist_ok=True)
+            temporario = f"{self.caminho}.tmp"
+            with open(temporario, "w", encoding="utf-8") as f: f.write(conteudo)
+            os.replace(temporario, self.caminho)
+        except OSError as e:
+            logger.warning(f"Não foi possível persistir a memória de matches: {e}")
+
+    def estatisticas(self):
+        with self._lock:
+            return {"entradas": len(self._itens), "revisao": self.revisao,
+                    "acertos": sum(item["acertos"] for item in self._itens.values())}
+
+_MEMORIA_PADRAO = None
+
+def memoria_padrao(caminho=CAMINHO_MEMORIA):
+    # Instância única por processo, compartilhada pelas sessões do Streamlit
+    global _MEMORIA_PADRAO
+    if _MEMORIA_PADRAO is None or _MEMORIA_PADRAO.caminho != caminho: _MEMORIA_PADRAO = MemoriaMatch(caminho)
+    return _MEMORIA_PADRAO
@@ -0,0 +1,74 @@
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("FLV_Enterprise.metricas")
+
+CAMINHO_PROMETHEUS = os.path.join(".cache", "metricas_auditoria.prom")
+PREFIXO_PROMETHEUS = "flv_auditoria"
+QUANTIS = (0.5, 0.9, 0.99)
+
+def percentil(valores, quantil):
+    # Nearest-rank: sem interpolação, suficiente para dezenas/centenas de chamadas
+    if not valores: return None
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, max(0, round(quantil * len(ordenados)) - 1))]
+
+class MetricasExecucao:
+    """Durações, contagens e latências de uma execução da auditoria."""
+    def __init__(self):
+        self.inicio = time.time()
+        self.duracoes = {}
+        self.contagens = {}
+        self.latencias = {}
+
+    @contextmanager
+    def etapa(self, nome):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar_duracao(nome, time.perf_counter() - inicio)
+
+    def registrar_duracao(self, nome, segundos):
+        self.duracoes[nome] = self.duracoes.get(nome, 0.0) + segundos
+
+    def contar(self, nome, valor=1):
+        self.contagens[nome] = self.contagens.get(nome, 0) + valor
+
+    def registrar_latencias(self, nome, segundos):
+        self.latencias.setdefault(nome, []).extend(segundos)
+
+    def resumo(self):
+        return {"inicio": self.inicio,
+                "duracoes_s": {nome: round(s, 6) for nome, s in self.duracoes.items()},
+                "contagens": dict(self.contagens),
+                "latencias_s": {nome: {f"p{int(q * 100)}": percentil(valores, q) for q in QUANTIS} | {"n": len(valores)}
+                                for nome, valores in self.latencias.items()}}
+
+    def para_prometheus(self, prefixo=PREFIXO_PROMETHEUS):
+        linhas = [f"# HELP {prefixo}_etapa_segundos Duração de cada etapa da última auditoria.",
+                  f"# TYPE {prefixo}_etapa_segundos gauge"]
+        linhas += [f'{prefixo}_etapa_segundos{{etapa="{nome}"}} {s:.6f}' for nome, s in self.duracoes.items()]
+        linhas += [f"# HELP {prefixo}_contagem Volumes e contadores da última auditoria.", f"# TYPE {prefixo}_contagem gauge"]
+        linhas += [f'{prefixo}_contagem{{nome="{nome}"}} {valor}' for nome, valor in self.contagens.items()]
+        if self.latencias:
+            linhas += [f"# HELP {prefixo}_latencia_segundos Quantis de latência das chamadas externas.", f"# TYPE {prefixo}_latencia_segundos gauge"]
+            for nome, valores in self.latencias.items():
+                linhas += [f'{prefixo}_latencia_segundos{{nome="{nome}",quantil="{q}"}} {percentil(valores, q):.6f}' for q in QUANTIS if valores]
+        linhas += [f"# TYPE {prefixo}_ultima_execucao_timestamp_segundos gauge", f"{prefixo}_ultima_execucao_timestamp_segundos {self.inicio:.0f}"]
+        return "\n".join(linhas) + "\n"
+
+    def publicar(self, caminho_prometheus=CAMINHO_PROMETHEUS):
+        """Uma linha JSON no log e o arquivo texto do Prometheus (textfile collector), escrito de forma atômica."""
+        logger.info(json.dumps({"evento": "auditoria_metricas", **self.resumo()}, ensure_ascii=False))
+        if not caminho_prometheus: return
+        try:
+            os.makedirs(os.path.dirname(caminho_prometheus) or ".", exist_ok=True)
+            temporario = f"{caminho_prometheus}.tmp"
+            with open(temporario, "w", encoding="utf-8") as f: f.write(self.para_prometheus())
+            os.replace(temporario, caminho_prometheus)
+        except OSError as e:
+            logger.warning(f"Não foi possível gravar as métricas do Prometheus: {e}")
@@ -0,0 +1,41 @@
+import numpy as np
+from rapidfuzz import fuzz, process
+
+# ==========================================
+# MOTOR FUZZY VETORIZADO (FASE 2)
+# ==========================================
+def ordenar_tokens(textos):
+    # Pré-normalização única: token_sort_ratio(a, b) == ratio(sort(a), sort(b))
+    return [" ".join(sorted(str(t).split())) for t in textos]
+
+class MotorFuzzy:
+    def __init__(self, fuzzy_threshold, workers=-1):
+        self.FUZZY_THRESHOLD = fuzzy_threshold
+        self.workers = workers
+        self.comparacoes = 0
+
+    def pares_candidatos(self, produtos_ped, produtos_xml):
+        """Pontua a matriz Pedido x NFe em uma única chamada e devolve (score, i, j) do maior para o menor.
+
+        O desempate preserva a ordem do laço original (pedido, depois nota), pois a ordenação é estável.
+        """
+        if len(produtos_ped) == 0 or len(produtos_xml) == 0: return []
+        self.comparacoes += len(produtos_ped) * len(produtos_xml)
+
+        scores = process.cdist(ordenar_tokens(produtos_ped), ordenar_tokens(produtos_xml),
+                               scorer=fuzz.ratio, score_cutoff=self.FUZZY_THRESHOLD,
+                               dtype=np.float64, workers=self.workers)
+        idx_ped, idx_xml = np.nonzero(scores >= self.FUZZY_THRESHOLD)
+        valores = scores[idx_ped, idx_xml]
+        ordem = np.argsort(-valores, kind='stable')
+        return list(zip(valores[ordem].tolist(), idx_ped[ordem].tolist(), idx_xml[ordem].tolist()))
+
+    def parear(self, produtos_ped, produtos_xml):
+        """Atribuição gulosa (maior score primeiro), sem reutilizar pedido ou nota já pareados."""
+        usados_ped, usados_xml = set(), set()
+        pares = []
+        for score, i, j in self.pares_candidatos(produtos_ped, produtos_xml):
+            if i in usados_ped or j in usados_xml: continue
+            usados_ped.add(i); usados_xml.add(j)
+            pares.append((score, i, j))
+        return pares
@@ -0,0 +1,137 @@
+import hashlib
+import pandas as pd
+import re
+import unicodedata
+from collections import deque
+from functools import lru_cache
+
+# ==========================================
+# NORMALIZAÇÃO E RESOLUÇÃO DE NOMES
+# ==========================================
+# Módulo sem dependência de Streamlit: importável pelos workers de ingestão.
+# ~2k nomes distintos por dia: o LRU cobre com folga e limita a memória do processo
+TAMANHO_CACHE_NORMALIZAR = 16384
+_RE_CARACTERES_INVALIDOS = re.compile(r'[^\w\s\.\-]')
+
+@lru_cache(maxsize=TAMANHO_CACHE_NORMALIZAR)
+def _normalizar_texto(texto):
+    texto = texto.upper().strip()
+    texto = unicodedata.normalize('NFKD', texto).encode('ASCII', 'ignore').decode('ASCII')
+    return _RE_CARACTERES_INVALIDOS.sub('', texto)
+
+def normalizar(texto):
+    if pd.isna(texto) or texto is None: return ""
+    return _normalizar_texto(str(texto))
+
+def normalizar_serie(serie):
+    """Versão em lote de normalizar: cada valor distinto da Series é calculado uma única vez."""
+    serie = pd.Series(serie, dtype=object)
+    resultado = pd.Series("", index=serie.index, dtype=object)
+    validos = serie.notna()
+    if validos.any():
+        codigos, unicos = pd.factorize(serie[validos].astype(str))
+        resultado[validos] = pd.Series(unicos, dtype=object).map(_normalizar_texto).to_numpy()[codigos]
+    return resultado
+
+def estatisticas_normalizar():
+    info = _normalizar_texto.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "tamanho": info.currsize, "limite": info.maxsize}
+
+# ==========================================
+# RESOLVEDORES COMPILADOS (construídos uma vez por carga do banco)
+# ==========================================
+LIMITE_MEMO = 50_000
+
+def assinatura_mapeamento(*mapeamentos):
+    # Identifica o conteúdo do cadastro: muda quando qualquer padrão, prioridade ou destino muda
+    return hashlib.sha256(repr(mapeamentos).encode("utf-8")).hexdigest()[:16]
+
+class AutomatoAhoCorasick:
+    """Busca multi-padrão em O(len(texto)); devolve o índice do padrão de maior prioridade (menor índice) contido no texto."""
+    def __init__(self, padroes):
+        self._goto, self._falha, self._melhor = [{}], [0], [None]
+        for rank, padrao in enumerate(padroes):
+            estado = 0
+            for ch in padrao:
+                prox = self._goto[estado].get(ch)
+                if prox is None:
+                    prox = len(self._goto)
+                    self._goto.append({}); self._falha.append(0); self._melhor.append(None)
+                    self._goto[estado][ch] = prox
+                estado = prox
+            if self._melhor[estado] is None: self._melhor[estado] = rank
+
+        # BFS: links de falha e propagação do melhor rank pelos sufixos
+        fila = deque(self._goto[0].values())
+        while fila:
+            estado = fila.popleft()
+            for ch, prox in self._goto[estado].items():
+                fila.append(prox)
+                f = self._falha[estado]
+                while f and ch not in self._goto[f]: f = self._falha[f]
+                self._falha[prox] = self._goto[f].get(ch, 0) if estado else 0
+                self._melhor[prox] = self._min_rank(self._melhor[prox], self._melhor[self._falha[prox]])
+
+    @staticmethod
+    def _min_rank(a, b):
+        if a is None: return b
+        if b is None: return a
+        return min(a, b)
+
+    def melhor(self, texto):
+        goto, falha, melhor_estado = self._goto, self._falha, self._melhor
+        melhor, estado = melhor_estado[0], 0
+        for ch in texto:
+            while estado and ch not in goto[estado]: estado = falha[estado]
+            estado = goto[estado].get(ch, 0)
+            if melhor_estado[estado] is not None and (melhor is None or melhor_estado[estado] < melhor):
+                melhor = melhor_estado[estado]
+                if melhor == 0: break
+        return melhor
+
+class ResolvedorFornecedor:
+    """Primeiro padrão do mapeamento (ORDER BY prioridade DESC) contido no nome normalizado; sem padrão, o próprio nome."""
+    def __init__(self, mapping_forn):
+        self._macros = list(mapping_forn.values())
+        self.assinatura = assinatura_mapeamento(list(mapping_forn.items()))
+        self._automato = AutomatoAhoCorasick(list(mapping_forn.keys()))
+        self._memo = {}
+
+    def resolver(self, nome_bruto):
+        try: return self._memo[nome_bruto]
+        except (KeyError, TypeError): pass
+        nome = normalizar(nome_bruto)
+        rank = self._automato.melhor(nome)
+        macro = self._macros[rank] if rank is not None else nome.replace("FORNECEDOR", "").strip()
+        if len(self._memo) >= LIMITE_MEMO: self._memo.clear()
+        self._memo[nome_bruto] = macro
+        return macro
+
+class ResolvedorLoja:
+    """Sufixos de CNPJ via hash (prioridade primeiro), depois nomes via autômato; sem padrão, 'Loja_Desconhecida'."""
+    def __init__(self, mapping_nome, mapping_cnpj):
+        self._lojas_cnpj, self._rank_sufixo = [], {}
+        for rank, (padrao, loja) in enumerate(mapping_cnpj):
+            self._rank_sufixo.setdefault(padrao, rank)
+            self._lojas_cnpj.append(loja)
+        self._lojas_nome = [loja for _, loja in mapping_nome]
+        self._automato = AutomatoAhoCorasick([padrao for padrao, _ in mapping_nome])
+        self.assinatura = assinatura_mapeamento(list(mapping_nome), list(mapping_cnpj))
+        self._memo = {}
+
+    def resolver(self, cnpj_dest, nome_dest):
+        chave = (str(cnpj_dest), str(nome_dest))
+        loja = self._memo.get(chave)
+        if loja is not None: return loja
+
+        cnpj = ''.join(filter(str.isdigit, str(cnpj_dest)))
+        ranks = [self._rank_sufixo[cnpj[i:]] for i in range(len(cnpj) + 1) if cnpj[i:] in self._rank_sufixo]
+        if ranks:
+            loja = self._lojas_cnpj[min(ranks)]
+        else:
+            rank = self._automato.melhor(normalizar(nome_dest))
+            loja = self._lojas_nome[rank] if rank is not None else 'Loja_Desconhecida'
+
+        if len(self._memo) >= LIMITE_MEMO: self._memo.clear()
+        self._memo[chave] = loja
+        return loja
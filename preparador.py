@@ -0,0 +1,107 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# PARSER DA MATRIZ DO COMPRADOR (Preparador)
+# ==========================================
+COLUNAS_PREPARADOR = ["Loja", "Fornecedor_Cod", "Fornecedor_Nome", "Produto_Cod", "Produto_Desc", "Qtd_Cx", "Padrao", "Custo"]
+PREFIXOS_COD_FORN = ("CÓD. FORN", "CÓDIGO FORN", "CODIGO FORN")
+PREFIXOS_IGNORADOS = ("PEDIDO FLV", "PEDIDO HORTIFRUT", "CÓD", "CODIGO", "CÓDIGO", "DESCRIÇÃO", "DESCRICAO", "TOTAL", "MÉDIA", "MEDIA", "FORNECEDOR", "ESTOQUE")
+_RE_NUMERO = re.compile(r'[\d\.]+')
+
+def ler_planilhas_comprador(arquivo):
+    if arquivo.name.endswith('.csv'):
+        return [pd.read_csv(arquivo, header=None, low_memory=False)]
+    return list(pd.read_excel(arquivo, sheet_name=None, header=None).values())
+
+def _eh_coluna_loja(texto):
+    return texto.startswith("L") and texto.replace("L", "").strip().isdigit()
+
+def _numero_em_texto(valor, padrao):
+    match = _RE_NUMERO.search(str(valor).replace(',', '.').strip())
+    if match:
+        try: return float(match.group())
+        except ValueError: pass
+    return padrao
+
+def _quantidade(valor):
+    texto = str(valor)
+    if texto.strip() == "": return np.nan
+    try: return float(texto.replace(',', '.'))
+    except ValueError: return np.nan
+
+def _por_valor_unico(codigos, unicos, func, valor_na):
+    # Aplica func uma vez por valor distinto presente e espalha o resultado pelas células (código -1 = NaN)
+    tabela = np.full(len(unicos) + 1, valor_na, dtype=object)
+    presentes = np.unique(codigos)
+    presentes = presentes[presentes >= 0]
+    tabela[presentes] = [func(unicos[c]) for c in presentes]
+    return tabela[codigos]
+
+def extrair_registros_matriz(df_raw):
+    """Converte uma aba da matriz comercial em registros (uma linha por loja com quantidade > 0)."""
+    if df_raw.empty or df_raw.shape[1] < 2: return pd.DataFrame(columns=COLUNAS_PREPARADOR)
+
+    valores = df_raw.to_numpy(dtype=object)
+    n_linhas, n_colunas = valores.shape
+    # Fatoriza pela forma textual: 1, 1.0 e True são iguais para factorize, mas viram "1", "1.0" e "True"
+    celulas = pd.Series(valores.ravel(), dtype=object)
+    codigos, unicos = pd.factorize(celulas.astype(str).where(celulas.notna()).to_numpy(dtype=object))
+    codigos = codigos.reshape(n_linhas, n_colunas)
+    texto = _por_valor_unico(codigos, unicos, lambda v: str(v).strip(), "nan")
+    texto_up = _por_valor_unico(codigos, unicos, lambda v: str(v).strip().upper(), "NAN")
+    eh_loja = _por_valor_unico(codigos, unicos, lambda v: _eh_coluna_loja(str(v).strip().upper()), False).astype(bool)
+
+    col0, col1 = pd.Series(texto_up[:, 0]), pd.Series(texto_up[:, 1])
+    eh_pedido_flv = col0.str.startswith("PEDIDO FLV").to_numpy()
+    eh_cod_forn = (col0.str.startswith(PREFIXOS_COD_FORN) & ~eh_pedido_flv).to_numpy()
+    eh_mapeamento = eh_loja.any(axis=1) & ~eh_pedido_flv
+    eh_produto = ((col0 != "") & (col0 != "NAN") & (col1 != "") & (col1 != "NAN") & ~col0.str.startswith(PREFIXOS_IGNORADOS)).to_numpy() & ~eh_pedido_flv & ~eh_mapeamento
+
+    # Contexto do fornecedor propagado para baixo (forward-fill)
+    nomes = pd.Series(texto[:, 0]).str.replace("PEDIDO FLV", "", regex=False).str.strip()
+    forn_nome = nomes.where(eh_pedido_flv).ffill().fillna("INDEFINIDO").to_numpy()
+    cod_valido = eh_cod_forn & (texto[:, 1] != "") & (texto_up[:, 1] != "NAN")
+    forn_cod = pd.Series(texto[:, 1]).where(cod_valido).ffill().fillna("000000").to_numpy()
+
+    # Cada linha de produto pertence ao último cabeçalho "Lnn" acima dela
+    bloco = np.cumsum(eh_mapeamento)
+    eh_produto &= (forn_nome != "INDEFINIDO") & (bloco > 0)
+    linhas_mapeamento = np.flatnonzero(eh_mapeamento)
+
+    partes = {col: [] for col in COLUNAS_PREPARADOR}
+    for id_bloco in np.unique(bloco[eh_produto]):
+        linha_cab = linhas_mapeamento[id_bloco - 1]
+        cols_loja = np.flatnonzero(eh_loja[linha_cab])
+        if len(cols_loja) == 0: continue
+        cabecalho = texto_up[linha_cab]
+        padrao_col = custo_col = None
+        for c_idx in range(n_colunas):
+            if eh_loja[linha_cab, c_idx]: continue
+            if "PADRÃO" in cabecalho[c_idx] or "PADRAO" in cabecalho[c_idx] or "CX" in cabecalho[c_idx]: padrao_col = c_idx
+            elif "CUSTO" in cabecalho[c_idx]: custo_col = c_idx
+
+        linhas = np.flatnonzero(eh_produto & (bloco == id_bloco))
+        padrao = _por_valor_unico(codigos[linhas, padrao_col], unicos, lambda v: _numero_em_texto(v, 1.0), 1.0) if padrao_col is not None else np.full(len(linhas), 1.0, dtype=object)
+        custo = _por_valor_unico(codigos[linhas, custo_col], unicos, lambda v: _numero_em_texto(v, 0.0), 0.0) if custo_col is not None else np.full(len(linhas), 0.0, dtype=object)
+
+        # Melt: matriz (linhas x lojas) achatada na ordem linha -> coluna, igual ao laço original
+        qtd = _por_valor_unico(codigos[np.ix_(linhas, cols_loja)], unicos, _quantidade, np.nan).astype(float)
+        lojas = np.array([texto_up[linha_cab, c].replace("L", "").strip() for c in cols_loja], dtype=object)
+        pos_linha, pos_loja = np.nonzero(qtd > 0)
+        sel = linhas[pos_linha]
+        for col, valores_col in zip(COLUNAS_PREPARADOR, (lojas[pos_loja], forn_cod[sel], forn_nome[sel], texto[sel, 0], texto[sel, 1],
+                                                         qtd[pos_linha, pos_loja], padrao[pos_linha].astype(float), custo[pos_linha].astype(float))):
+            partes[col].append(valores_col)
+
+    if not partes["Loja"]: return pd.DataFrame(columns=COLUNAS_PREPARADOR)
+    return pd.DataFrame({col: np.concatenate(arrays) for col, arrays in partes.items()})
+
+def parsear_matriz_comprador(dfs):
+    """Registros de todas as abas, sem as duplicatas de abas clonadas. Retorna (df_pedidos, linhas_removidas)."""
+    df_pedidos = pd.concat([extrair_registros_matriz(df_raw) for df_raw in dfs], ignore_index=True) if dfs else pd.DataFrame(columns=COLUNAS_PREPARADOR)
+    linhas_antes = len(df_pedidos)
+    df_pedidos = df_pedidos.drop_duplicates(subset=['Loja', 'Fornecedor_Nome', 'Produto_Cod'], keep='first')
+    return df_pedidos, linhas_antes - len(df_pedidos)
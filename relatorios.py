@@ -0,0 +1,136 @@
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import PatternFill, Font, Alignment
+from openpyxl.utils import get_column_letter
+
+# ==========================================
+# ESTILOS COMPARTILHADOS (criados uma única vez)
+# ==========================================
+def _fill(cor):
+    return PatternFill(start_color=cor, end_color=cor, fill_type="solid")
+
+FILL_TITULO_AUDITORIA = _fill("000000")
+FILL_CABECALHO = _fill("002060")
+FILL_FORNECEDOR = _fill("D9E1F2")
+FONT_TITULO_AUDITORIA = Font(color="FFFFFF", bold=True, size=14)
+FONT_BRANCA = Font(color="FFFFFF", bold=True)
+FONT_FORNECEDOR = Font(color="002060", bold=True)
+FONT_NEGRITO = Font(bold=True)
+ALIGN_CENTRO = Alignment(horizontal="center", vertical="center")
+ALIGN_ESQUERDA = Alignment(horizontal="left", vertical="center")
+
+# Ordem importa: primeira marca encontrada no status define a cor
+CORES_STATUS = [("🟢", _fill("C6EFCE")), ("🔴", _fill("FFC7CE")), ("🟡 NFe SOBRA", _fill("FFEB9C")),
+                ("🟡 NFe EXTRA", _fill("FFEB9C")), ("🤖", _fill("E4DFEC")), ("⚪", _fill("F2F2F2"))]
+
+_FILL_POR_STATUS = {}
+
+def fill_status(status):
+    # Memo pelo prefixo sem a quantidade ("🔴 NFe FALTA 3.5" -> "🔴 NFe FALTA"): o dicionário não cresce a cada auditoria
+    if not status: return None
+    marca_status = status.rstrip("0123456789.,-() ")
+    if marca_status not in _FILL_POR_STATUS:
+        _FILL_POR_STATUS[marca_status] = next((fill for marca, fill in CORES_STATUS if marca in marca_status), None)
+    return _FILL_POR_STATUS[marca_status]
+
+# ==========================================
+# ESCRITOR STREAMING (write-only)
+# ==========================================
+class PlanilhaStreaming:
+    """Aba write-only: as linhas vão direto para o arquivo temporário do openpyxl, sem manter células em memória."""
+    def __init__(self, wb, titulo, larguras):
+        self.ws = wb.create_sheet(title=titulo)
+        # Larguras precisam ser definidas antes da primeira linha no modo write-only
+        for coluna, largura in larguras.items(): self.ws.column_dimensions[coluna].width = largura
+        self.linha = 0
+
+    def celula(self, valor, fill=None, font=None, alignment=None, number_format=None):
+        cell = WriteOnlyCell(self.ws, value=valor)
+        if fill is not None: cell.fill = fill
+        if font is not None: cell.font = font
+        if alignment is not None: cell.alignment = alignment
+        if number_format is not None: cell.number_format = number_format
+        return cell
+
+    def append(self, valores):
+        self.ws.append(valores)
+        self.linha += 1
+
+    def mesclar_linha(self, col_inicio, col_fim):
+        self.ws.merged_cells.add(f"{get_column_letter(col_inicio)}{self.linha}:{get_column_letter(col_fim)}{self.linha}")
+
+def novo_workbook():
+    return Workbook(write_only=True)
+
+# ==========================================
+# RELATÓRIO DE AUDITORIA
+# ==========================================
+COLUNAS_AUDITORIA = ['produto_pedido', 'qtd_pedido', 'produto_xml', 'qtd_nota', 'origem_match', 'status_visual', 'justificativa_ia', 'qtd_fisico', 'padrao_fisico', 'status_doca']
+CABECALHO_AUDITORIA = ['Produto Pedido', 'Qtd Ped', 'Produto NFe', 'Qtd NFe', 'Origem Dados', 'Status NFe', 'Obs NFe (IA)', 'Qtd Doca', 'Padrão Doca', 'Status Doca']
+LARGURAS_AUDITORIA = {'A': 30, 'C': 30, 'E': 15, 'F': 25, 'G': 35, 'J': 25}
+
+LARGURAS_SUGESTOES = {'A': 30, 'B': 30, 'C': 30, 'G': 90}
+CABECALHO_SUGESTOES = ['Fornecedor na NFe', 'Fornecedor no Pedido', 'Nome no Pedido', 'Itens', 'Lojas', 'Score Médio', 'Exemplos']
+
+def gerar_excel_auditoria(df_final, sugestoes_fornecedor=None):
+    # Categóricas (loja, fornecedor, status) não têm nulos e não aceitam "" como valor novo
+    df_final = df_final.fillna({col: "" for col, tipo in df_final.dtypes.items() if tipo != "category"})
+    wb = novo_workbook()
+
+    # Uma partição por loja num único groupby (ordenado como antes), em vez de uma máscara por loja
+    for loja, df_loja in df_final.groupby('loja', sort=True, observed=True):
+        ps = PlanilhaStreaming(wb, loja, LARGURAS_AUDITORIA)
+        ps.append([ps.celula(f"AUDITORIA DEFINITIVA - {loja.upper().replace('_', ' ')}", FILL_TITULO_AUDITORIA, FONT_TITULO_AUDITORIA, ALIGN_CENTRO)])
+        ps.mesclar_linha(1, 10)
+        ps.append([ps.celula(titulo, font=FONT_NEGRITO) for titulo in CABECALHO_AUDITORIA])
+
+        # Alimentado por colunas (listas), não por Series de linha
+        colunas = [df_loja[col].tolist() for col in COLUNAS_AUDITORIA]
+        current_forn = None
+        for fornecedor, *valores in zip(df_loja['fornecedor'].tolist(), *colunas):
+            if fornecedor != current_forn:
+                if current_forn is not None: ps.append([])
+                current_forn = fornecedor
+                ps.append([ps.celula(f"Fornecedor: {current_forn}", FILL_FORNECEDOR, FONT_FORNECEDOR)] + [ps.celula("", FILL_FORNECEDOR, FONT_FORNECEDOR) for _ in range(9)])
+                ps.mesclar_linha(1, 10)
+
+            valores[5] = ps.celula(valores[5], fill=fill_status(valores[5]))
+            ps.append(valores)
+
+    # Pedido sem NFe + NFe sem pedido com os mesmos produtos: provável emitente mapeado para outro fornecedor
+    if sugestoes_fornecedor is not None and not sugestoes_fornecedor.empty:
+        ps = PlanilhaStreaming(wb, "Sugestões Fornecedor", LARGURAS_SUGESTOES)
+        ps.append([ps.celula(titulo, FILL_CABECALHO, FONT_BRANCA) for titulo in CABECALHO_SUGESTOES])
+        for linha in sugestoes_fornecedor.itertuples(index=False): ps.append(list(linha))
+    return wb
+
+# ==========================================
+# RELATÓRIO DO PREPARADOR (arquivo da Doca)
+# ==========================================
+LARGURAS_PREPARADOR = {'A': 15, 'B': 45, 'C': 15, 'D': 15, 'E': 15}
+
+def _numero_limpo(valor):
+    return int(valor) if valor.is_integer() else valor
+
+def gerar_excel_preparador(df_pedidos, data_hoje):
+    wb = novo_workbook()
+    lojas_encontradas = sorted(df_pedidos['Loja'].unique(), key=lambda x: int(x) if str(x).isdigit() else str(x))
+    df_pedidos = df_pedidos.assign(Forn_Full=df_pedidos['Fornecedor_Cod'].astype(str) + " - " + df_pedidos['Fornecedor_Nome'])
+    grupos_loja = dict(tuple(df_pedidos.groupby('Loja', sort=False)))
+
+    for loja in lojas_encontradas:
+        ps = PlanilhaStreaming(wb, f"Loja_{loja}", LARGURAS_PREPARADOR)
+        ps.append([ps.celula(f"CONFERÊNCIA - LOJA {loja}", FILL_CABECALHO, FONT_BRANCA, ALIGN_ESQUERDA), "", "", "",
+                   ps.celula(f"Data: {data_hoje}", FILL_CABECALHO, FONT_BRANCA, ALIGN_CENTRO)])
+        ps.mesclar_linha(1, 3)
+        ps.append([ps.celula(titulo, font=FONT_NEGRITO, alignment=ALIGN_CENTRO) for titulo in ["Código", "Descrição", "Qtd_Pedida", "Padrão_Cx", "Custo"]])
+
+        for fornecedor_str, df_forn in grupos_loja[loja].groupby('Forn_Full', sort=True):
+            ps.append([ps.celula(f"Fornecedor: {fornecedor_str}", FILL_FORNECEDOR, FONT_FORNECEDOR, ALIGN_ESQUERDA)] + [ps.celula("", FILL_FORNECEDOR, FONT_FORNECEDOR, ALIGN_ESQUERDA) for _ in range(4)])
+            ps.mesclar_linha(1, 5)
+
+            for cod_p, desc, qtd_c, pad_c, cst_c in zip(df_forn['Produto_Cod'].tolist(), df_forn['Produto_Desc'].tolist(), df_forn['Qtd_Cx'].tolist(), df_forn['Padrao'].tolist(), df_forn['Custo'].tolist()):
+                if str(cod_p).replace('.', '').isdigit():
+                    cod_p = int(float(cod_p))
+                ps.append([cod_p, desc, _numero_limpo(qtd_c), _numero_limpo(pad_c), ps.celula(cst_c, number_format='R$ #,##0.00')])
+    return wb
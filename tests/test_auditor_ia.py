@@ -0,0 +1,70 @@
+import threading
+import time
+
+from auditor_ia import AuditorIA, CacheIA
+
+class _Resposta:
+    def __init__(self, text):
+        self.text = text
+
+class ModeloIAFake:
+    """Imita GenerativeModel.generate_content: justifica quando o infCpl cita alguma palavra-chave."""
+    def __init__(self, palavras_chave=("QUEBRA", "AVARIA"), latencia=0.0, falhar_em=()):
+        self.palavras_chave = palavras_chave
+        self.latencia = latencia
+        self.falhar_em = falhar_em
+        self.chamadas = self.simultaneas = self.max_simultaneas = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, request_options=None):
+        with self._lock:
+            self.chamadas += 1
+            self.simultaneas += 1
+            self.max_simultaneas = max(self.max_simultaneas, self.simultaneas)
+        try:
+            if self.latencia: time.sleep(self.latencia)
+            texto_nota = prompt.split("escreveu na nota:", 1)[-1].upper()
+            if any(p in texto_nota for p in self.falhar_em): raise TimeoutError("timeout simulado")
+            if any(p in texto_nota for p in self.palavras_chave): return _Resposta("[SIM] - Fornecedor declarou a ocorrência na nota.")
+            return _Resposta("[NAO] - Nota não menciona a falta.")
+        finally:
+            with self._lock: self.simultaneas -= 1
+
+def _auditor(modelo, **kwargs):
+    kwargs.setdefault("requisicoes_por_segundo", 0)
+    return AuditorIA(modelo, cache=CacheIA(caminho=None), **kwargs)
+
+def test_lote_preserva_ordem_e_deduplica():
+    modelo = ModeloIAFake()
+    auditor = _auditor(modelo)
+    consultas = [("TOMATE", -2, "Houve quebra na carga"), ("ALFACE", -1, "Entrega normal"), ("TOMATE", -2, "Houve quebra na carga"), ("BANANA", -3, "")]
+    resultados = auditor.analisar_lote(consultas)
+
+    assert [justificado for justificado, _ in resultados] == [True, False, True, False]
+    assert resultados[3] == (False, "")  # infCpl vazio não é elegível
+    assert modelo.chamadas == 2
+
+def test_cache_evita_nova_chamada_e_falha_nao_entra():
+    modelo = ModeloIAFake(falhar_em=("TIMEOUT",))
+    auditor = _auditor(modelo)
+    consultas = [("TOMATE", -2, "Houve avaria"), ("ALFACE", -1, "TIMEOUT aqui")]
+    assert auditor.analisar_lote(consultas)[1] == (False, "Erro IA")
+    assert auditor.falhas == 1
+
+    auditor.analisar_lote(consultas)
+    assert auditor.acertos_cache == 1
+    assert modelo.chamadas == 3  # a falha é consultada de novo, o acerto não
+
+def test_concorrencia_limitada():
+    modelo = ModeloIAFake(latencia=0.02)
+    auditor = _auditor(modelo, max_concorrencia=3)
+    auditor.analisar_lote([(f"PRODUTO {i}", -1, f"Nota número {i}") for i in range(12)])
+    assert modelo.chamadas == 12
+    assert 1 < modelo.max_simultaneas <= 3
+
+def test_limitador_espaca_as_chamadas():
+    auditor = _auditor(ModeloIAFake(), requisicoes_por_segundo=50.0, max_concorrencia=8)
+    inicio = time.perf_counter()
+    auditor.analisar_lote([(f"PRODUTO {i}", -1, f"Nota número {i}") for i in range(6)])
+    # 6 chamadas a 50/s: a primeira sai na hora, as outras 5 esperam 20 ms cada
+    assert time.perf_counter() - inicio >= 5 / 50.0 * 0.9
@@ -0,0 +1,19 @@
+import pandas as pd
+
+from auditoria import AuditoriaService
+
+def _pedidos(linhas):
+    return pd.DataFrame(linhas, columns=["Loja", "Fornecedor_Original", "Fornecedor_Macro", "Produto", "Qtd"])
+
+def _notas(linhas):
+    return pd.DataFrame(linhas, columns=["Loja", "Fornecedor_Macro", "Produto", "Qtd", "Origem"])
+
+def test_notas_sem_pedido_so_das_lojas_do_pedido():
+    pedidos = _pedidos([("Loja_01", "CEASA LTDA", "CEASA", "TOMATE", 10.0)])
+    notas = _notas([("Loja_01", "CEASA", "TOMATE", 10.0, "Exato"), ("Loja_01", "HORTA", "ALFACE", 5.0, "Exato"),
+                    ("Loja_09", "CEASA", "BATATA", 8.0, "Exato")])
+    resultado = AuditoriaService(False, 85).processar_cruzamento(pedidos, notas, {})
+
+    assert set(resultado["loja"].astype(str)) == {"Loja_01"}
+    assert resultado[["fornecedor", "produto_xml", "status_codigo"]].astype(str).values.tolist() == [
+        ["CEASA LTDA", "TOMATE", "0"], ["HORTA (sem pedido)", "ALFACE", "2"]]
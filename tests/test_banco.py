@@ -0,0 +1,107 @@
+import sqlite3
+import threading
+
+import pytest
+
+pytest.importorskip("psycopg2")
+import banco
+
+@pytest.fixture
+def conn_sqlite():
+    # Dublê local do Neon: sem copy_expert, o carregador cai no cursor comum
+    conn = sqlite3.connect(":memory:")
+    conn.executescript("""
+        CREATE TABLE depara_flv (cnpj_fornecedor TEXT, cod_produto_xml TEXT, descricao_interna TEXT, fator_conversao REAL);
+        CREATE TABLE fornecedores_mapeamento (nome_original TEXT, nome_macro TEXT, prioridade INTEGER);
+        CREATE TABLE lojas_mapeamento (padrao TEXT, tipo TEXT, loja TEXT, prioridade INTEGER);
+        INSERT INTO depara_flv VALUES ('12.345.678/0001-90', '00123', ' TOMATE ITALIANO KG ', 1.0), ('11222333000144', '77', 'BANANA PRATA CX', 20);
+        INSERT INTO fornecedores_mapeamento VALUES (' ceasa distrib ', 'CEASA', 1), ('VERDE CAMPO', 'VERDE', 2);
+        INSERT INTO lojas_mapeamento VALUES ('loja 1', 'N', 'Loja_01', 1), ('000199', 'C', 'Loja_02', 2);
+    """)
+    yield conn
+    conn.close()
+
+def test_carregar_depara_pelo_cursor(conn_sqlite):
+    assert banco.carregar_depara(conn_sqlite) == {
+        ("12345678000190", "123"): ("TOMATE ITALIANO KG", 1.0),
+        ("11222333000144", "77"): ("BANANA PRATA CX", 20.0),
+    }
+
+def test_carregar_mapeamentos(conn_sqlite):
+    mapping_forn, mapping_nome, mapping_cnpj = banco.carregar_mapeamentos(conn_sqlite)
+    assert list(mapping_forn.items()) == [("VERDE CAMPO", "VERDE"), ("CEASA DISTRIB", "CEASA")]
+    assert mapping_nome == [("LOJA 1", "Loja_01")]
+    assert mapping_cnpj == [("000199", "Loja_02")]
+
+class _ConexaoFake:
+    closed = 0
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+
+class _PoolFake:
+    def __init__(self, minimo, maximo, dsn):
+        self.emprestadas = 0
+
+    def getconn(self):
+        self.emprestadas += 1
+        return _ConexaoFake()
+
+    def putconn(self, conn, close=False):
+        self.emprestadas -= 1
+
+    def closeall(self): pass
+
+@pytest.fixture
+def pool_fake(monkeypatch):
+    monkeypatch.setattr(banco.pg_pool, "ThreadedConnectionPool", _PoolFake)
+    yield
+    banco.fechar_pools()
+
+def test_pool_cheio_espera_e_desiste(pool_fake):
+    with banco.conexao("fake://a", max_conexoes=1):
+        with pytest.raises(banco.pg_pool.PoolError):
+            with banco.conexao("fake://a", espera=0.05): pass
+    # Devolvida a conexão, a próxima sessão entra
+    with banco.conexao("fake://a") as conn: assert conn is not None
+
+def test_pool_cheio_atende_quando_liberar(pool_fake):
+    liberar, entrou = threading.Event(), threading.Event()
+
+    def segurar():
+        with banco.conexao("fake://b", max_conexoes=1):
+            entrou.set()
+            liberar.wait(5)
+
+    t = threading.Thread(target=segurar)
+    t.start()
+    entrou.wait(5)
+    threading.Timer(0.05, liberar.set).start()
+    with banco.conexao("fake://b", espera=5) as conn: assert conn is not None
+    t.join()
+
+def test_invalidar_recarrega_edicao_sem_updated_at(conn_sqlite):
+    cache = banco.CacheDePara(intervalo_verificacao=3600.0)
+    cache._com_versao = False  # depara_flv original: sem coluna updated_at
+    abrir = lambda: conn_sqlite
+    assert cache.obter(abrir)[("11222333000144", "77")] == ("BANANA PRATA CX", 20.0)
+
+    # Edição de linha existente: count(*) não muda
+    conn_sqlite.execute("UPDATE depara_flv SET descricao_interna = 'BANANA NANICA CX' WHERE cod_produto_xml = '77'")
+    cache._ultima_verificacao = 0.0
+    assert cache.obter(abrir)[("11222333000144", "77")] == ("BANANA PRATA CX", 20.0)
+
+    cache.invalidar()
+    assert cache.obter(abrir)[("11222333000144", "77")] == ("BANANA NANICA CX", 20.0)
+    assert cache.misses == 2
+
+def test_carga_fria_le_as_tres_tabelas_numa_sessao(conn_sqlite):
+    cache = banco.CacheDePara(intervalo_verificacao=3600.0)
+    cache._com_versao = False
+    sessoes = []
+    abrir = lambda: sessoes.append(1) or conn_sqlite
+
+    dict_depara, (mapping_forn, mapping_nome, mapping_cnpj) = cache.obter(abrir, com_mapeamentos=True)
+    assert len(sessoes) == 1 and len(dict_depara) == 2
+    assert mapping_forn["CEASA DISTRIB"] == "CEASA" and mapping_cnpj == [("000199", "Loja_02")]
+    # O De-Para pedido logo depois sai do cache, sem nova sessão
+    assert cache.obter(abrir) is dict_depara and len(sessoes) == 1
@@ -0,0 +1,20 @@
+import cache_entradas
+from cache_entradas import CacheEntradas, cache_padrao
+
+def test_lru_despeja_por_tamanho():
+    cache = CacheEntradas(limite_bytes=3500)
+    for i in range(3): cache.gravar(i, b"x" * 1000)
+    cache.obter(0)
+    cache.gravar(3, b"x" * 1000)
+    assert cache.obter(1) is None and cache.obter(0) is not None
+    assert cache.despejos == 1
+
+def test_cache_padrao_segue_o_limite_configurado(monkeypatch):
+    monkeypatch.setattr(cache_entradas, "_CACHE_PADRAO", None)
+    cache = cache_padrao(1)
+    for i in range(4): cache.gravar(i, b"x" * 200_000)
+    assert cache_padrao(1) is cache and len(cache._itens) == 4
+
+    assert cache_padrao(0.5) is cache
+    assert cache.limite_bytes == 512 * 1024
+    assert cache._bytes <= cache.limite_bytes and cache.obter(3) is not None
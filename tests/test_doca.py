@@ -0,0 +1,49 @@
+import io
+
+import pandas as pd
+import pytest
+
+from doca import ler_contagens, loja_do_nome, aplicar_contagem, SEM_CONTAGEM
+
+@pytest.mark.parametrize("nome, esperado", [
+    ("Planilha1", None), ("Sheet1", None), ("CONTROL3", None),
+    ("2026-10-18_loja3.csv", "3"), ("Loja_03", "3"), ("L3", "3"), ("contagem_L07_manha.xlsx", "7"),
+])
+def test_loja_do_nome(nome, esperado):
+    assert loja_do_nome(nome) == esperado
+
+def _xlsx(nome, abas):
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer) as writer:
+        for aba, df in abas.items(): df.to_excel(writer, sheet_name=aba, index=False)
+    buffer.seek(0)
+    buffer.name = nome
+    return buffer
+
+def test_aba_padrao_usa_nome_do_arquivo_e_descarta_sem_loja():
+    contagem = pd.DataFrame({"Produto": ["TOMATE"], "Qtd Contada": [2]})
+    arquivos = [_xlsx("Loja_01_manha.xlsx", {"Planilha1": contagem}), _xlsx("Loja_02_manha.xlsx", {"Sheet1": contagem}),
+                _xlsx("contagem.xlsx", {"Planilha1": contagem})]
+    df_doca = ler_contagens(arquivos)
+    assert sorted(df_doca["Loja_Chave"]) == ["1", "2"]
+    assert df_doca["Qtd_Fisico"].tolist() == [2.0, 2.0]
+
+def _resultado(linhas):
+    # (loja, fornecedor, produto_pedido, produto_xml, qtd_nota)
+    df = pd.DataFrame(linhas, columns=["loja", "fornecedor", "produto_pedido", "produto_xml", "qtd_nota"])
+    n = len(df)
+    return df.assign(qtd_fisico=["-"] * n, padrao_fisico=["-"] * n, status_doca=[SEM_CONTAGEM] * n, diferenca_doca=[0.0] * n)
+
+def test_contagem_aplicada_uma_vez_por_loja_e_produto():
+    df_final = _resultado([("Loja_01", "CEASA LTDA", "TOMATE", "TOMATE", 4.0), ("Loja_01", "CEASA S/A", "TOMATE", "TOMATE", 6.0),
+                           ("Loja_01", "N/A (extra na nota)", "❌ NÃO PEDIDO", "BATATA", 5.0), ("Loja_02", "CEASA LTDA", "TOMATE", "TOMATE", 3.0)])
+    df_doca = pd.DataFrame({"Loja_Chave": ["1", "1", "2"], "Produto": ["TOMATE", "BATATA", "TOMATE"],
+                            "Qtd_Fisico": [10.0, 7.0, 3.0], "Padrao_Fisico": [1.0, 1.0, 1.0]})
+    resultado = aplicar_contagem(df_final, df_doca)
+    assert resultado["qtd_fisico"].tolist() == [4.0, 6.0, 7.0, 3.0]
+    assert resultado["status_doca"].astype(str).tolist() == ["🟢 DOCA OK", "🟢 DOCA OK", "🟡 DOCA SOBRA 2", "🟢 DOCA OK"]
+
+    # Contagem menor que o total das notas: a falta aparece uma vez, não em cada linha
+    resultado = aplicar_contagem(df_final, df_doca.assign(Qtd_Fisico=[8.0, 5.0, 3.0]))
+    assert resultado["qtd_fisico"].tolist()[:2] == [4.0, 4.0]
+    assert resultado["diferenca_doca"].tolist()[:2] == [0.0, -2.0]
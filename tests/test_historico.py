@@ -0,0 +1,65 @@
+import pandas as pd
+import pytest
+
+import historico as h
+
+def _resultado(lojas, qtd_nota=10.0):
+    n = len(lojas)
+    return pd.DataFrame({
+        "loja": lojas, "fornecedor": ["CEASA"] * n, "produto_pedido": ["TOMATE"] * n, "produto_xml": ["TOMATE"] * n,
+        "qtd_pedido": [10.0] * n, "qtd_nota": [qtd_nota] * n, "origem_match": ["De-Para ⚡"] * n, "diferenca": [qtd_nota - 10.0] * n,
+        "status_visual": ["🟢 OK" if qtd_nota == 10.0 else "🔴 NFe FALTA"] * n, "status_codigo": [0 if qtd_nota == 10.0 else -1] * n,
+        "justificativa_ia": [""] * n, "qtd_fisico": ["-"] * n, "padrao_fisico": ["-"] * n, "status_doca": ["⚪ SEM CONTAGEM"] * n,
+        "diferenca_doca": [0.0] * n})
+
+def test_resumos_por_loja_e_fornecedor():
+    tabelas = h.montar_historico(_resultado(["Loja_01", "Loja_01", "Loja_02"], qtd_nota=8.0), "2026-10-18")
+    resumo = tabelas[h.TABELA_RESUMO_FORNECEDOR]
+    assert resumo[["loja", "fornecedor", "linhas", "itens_pedidos", "itens_falta", "falta_kg", "taxa_falta"]].values.tolist() == [
+        ["Loja_01", "CEASA", 2, 2, 2, 4.0, 1.0], ["Loja_02", "CEASA", 1, 1, 1, 2.0, 1.0]]
+    assert tabelas[h.TABELA_HISTORICO]["qtd_fisico"].isna().all()
+
+def test_auditorias_parciais_do_mesmo_dia_nao_se_apagam(tmp_path):
+    pytest.importorskip("pyarrow")
+    h.gravar_parquet(h.montar_historico(_resultado(["Loja_01", "Loja Centro"]), "2026-10-18"), tmp_path)
+    h.gravar_parquet(h.montar_historico(_resultado(["Loja_02"]), "2026-10-18"), tmp_path)
+    # Reauditoria da Loja Centro substitui só ela
+    h.gravar_parquet(h.montar_historico(_resultado(["Loja Centro"], qtd_nota=7.0), "2026-10-18"), tmp_path)
+
+    for tabela in (h.TABELA_HISTORICO, h.TABELA_RESUMO_FORNECEDOR, h.TABELA_RESUMO_LOJA):
+        df = h.ler_historico(tabela, tmp_path)
+        assert sorted(df["loja"].astype(str)) == ["Loja Centro", "Loja_01", "Loja_02"]
+    resumo = h.ler_historico(h.TABELA_RESUMO_LOJA, tmp_path)
+    resumo = resumo.set_index(resumo["loja"].astype(str))
+    assert resumo.loc["Loja Centro", "itens_falta"] == 1 and resumo.loc["Loja_01", "itens_ok"] == 1
+
+def test_loja_so_com_notas_extras_nao_substitui_auditoria_anterior(tmp_path):
+    pytest.importorskip("pyarrow")
+    h.gravar_parquet(h.montar_historico(_resultado(["Loja_02"]), "2026-10-18", lojas=["Loja_02"]), tmp_path)
+    # Auditoria da Loja_01 com notas do dia inteiro: Loja_02 aparece só com extras e fica de fora
+    extras = _resultado(["Loja_02"]).assign(produto_pedido="❌ NÃO PEDIDO", qtd_pedido=0.0, status_codigo=2)
+    tabelas = h.montar_historico(pd.concat([_resultado(["Loja_01"]), extras], ignore_index=True), "2026-10-18", lojas=["Loja_01"])
+    assert all(df["loja"].astype(str).tolist() == ["Loja_01"] for df in tabelas.values())
+    h.gravar_parquet(tabelas, tmp_path)
+
+    resumo = h.ler_historico(h.TABELA_RESUMO_LOJA, tmp_path)
+    resumo = resumo.set_index(resumo["loja"].astype(str))
+    assert resumo.loc["Loja_02", "itens_pedidos"] == 1 and resumo.loc["Loja_02", "itens_ok"] == 1
+
+class _Cursor:
+    def __init__(self): self.comandos = []
+    def execute(self, sql, parametros=None): self.comandos.append((sql.strip().split()[0], parametros))
+    def copy_expert(self, sql, buffer): self.comandos.append(("COPY", buffer.read().count("\n")))
+    def close(self): pass
+
+class _Conexao:
+    def __init__(self): self.cursor_ = _Cursor()
+    def cursor(self): return self.cursor_
+
+def test_copy_substitui_so_as_lojas_auditadas():
+    banco = pytest.importorskip("banco")
+    conn = _Conexao()
+    banco.gravar_historico(conn, h.montar_historico(_resultado(["Loja_02", "Loja_01"]), "2026-10-18"))
+    deletes = [parametros for comando, parametros in conn.cursor_.comandos if comando == "DELETE"]
+    assert deletes == [("2026-10-18", ["Loja_01", "Loja_02"])] * 3
+    assert [n for comando, n in conn.cursor_.comandos if comando == "COPY"] == [2, 2, 2]
@@ -0,0 +1,43 @@
+import io
+import zipfile
+
+import pytest
+
+from gerador_sintetico import gerar_cenario, gerar_xmls, ArquivoMemoria
+from ingestao_nfe import extrair_notas
+from normalizacao import ResolvedorFornecedor, ResolvedorLoja
+
+def _corromper(dados, inicio, tamanho):
+    # Inverte bytes no meio dos dados do membro: o cabeçalho do ZIP continua legível
+    meio = inicio + tamanho // 2
+    return dados[:meio] + bytes(b ^ 0x5A for b in dados[meio:meio + 8]) + dados[meio + 8:]
+
+def _zip_com_membros_danificados(xmls):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        zf.writestr("ok/nf0.xml", xmls[0], compress_type=zipfile.ZIP_STORED)
+        zf.writestr("crc.xml", xmls[1], compress_type=zipfile.ZIP_STORED)
+        zf.writestr("zlib.xml", xmls[2], compress_type=zipfile.ZIP_DEFLATED)
+        zf.writestr("cifrado.xml", xmls[3])
+        zf.writestr("ok/nf4.xml", xmls[4], compress_type=zipfile.ZIP_DEFLATED)
+        membros = {info.filename: info for info in zf.infolist()}
+    dados = buffer.getvalue()
+    for nome in ("crc.xml", "zlib.xml"):
+        info = membros[nome]
+        inicio = info.header_offset + 30 + len(info.filename.encode()) + len(info.extra)
+        dados = _corromper(dados, inicio, info.compress_size)
+    # writestr não grava membros criptografados: liga o bit 0 (encrypted) no cabeçalho local e no diretório central
+    cifrado = membros["cifrado.xml"]
+    central = dados.rindex(b"PK\x01\x02", 0, dados.index(b"cifrado.xml", cifrado.header_offset + 30 + len("cifrado.xml")))
+    for posicao in (cifrado.header_offset + 6, central + 8):
+        dados = dados[:posicao] + bytes([dados[posicao] | 0x1]) + dados[posicao + 1:]
+    return ArquivoMemoria(dados, "lote.zip")
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_membro_corrompido_e_descartado_sem_abortar(max_workers):
+    xmls = [arquivo.getvalue() for arquivo in gerar_xmls(gerar_cenario(lojas=1, fornecedores=6))[:5]]
+    contexto = ({}, ResolvedorFornecedor({}), ResolvedorLoja([], []))
+    esperado, _ = extrair_notas([ArquivoMemoria(xmls[0], "nf0.xml"), ArquivoMemoria(xmls[4], "nf4.xml")], *contexto, max_workers=1)
+
+    colunas, _ = extrair_notas([_zip_com_membros_danificados(xmls)], *contexto, max_workers=max_workers)
+    assert colunas["Produto"] and colunas == esperado
@@ -0,0 +1,43 @@
+import random
+
+import pytest
+from rapidfuzz import fuzz
+
+from motor_fuzzy import MotorFuzzy
+
+VOCABULARIO = ["TOMATE", "ITALIANO", "KG", "CX", "BANANA", "PRATA", "NANICA", "ALFACE", "CRESPA", "AMERICANA", "BDJ", "MACA", "GALA", "FUJI"]
+
+def parear_referencia(produtos_ped, produtos_xml, limiar):
+    """Laço original da FASE 2 (iterrows x token_sort_ratio, ordenação estável, guloso)."""
+    pares = []
+    for i, prod_ped in enumerate(produtos_ped):
+        for j, prod_xml in enumerate(produtos_xml):
+            score = fuzz.token_sort_ratio(prod_ped, prod_xml)
+            if score >= limiar: pares.append((score, i, j))
+    pares.sort(key=lambda x: x[0], reverse=True)
+    usados_ped, usados_xml, resultado = set(), set(), []
+    for score, i, j in pares:
+        if i in usados_ped or j in usados_xml: continue
+        usados_ped.add(i); usados_xml.add(j)
+        resultado.append((score, i, j))
+    return resultado
+
+def _produtos(rng, n):
+    # Vocabulário pequeno: muitos empates e nomes repetidos em ordens diferentes
+    return [" ".join(rng.sample(VOCABULARIO, rng.randint(1, 3))) for _ in range(n)]
+
+@pytest.mark.parametrize("semente", range(40))
+def test_parear_igual_ao_laco_original(semente):
+    rng = random.Random(semente)
+    produtos_ped, produtos_xml = _produtos(rng, rng.randint(0, 15)), _produtos(rng, rng.randint(0, 15))
+    limiar = rng.choice([50, 70, 85, 100])
+    assert MotorFuzzy(limiar, workers=1).parear(produtos_ped, produtos_xml) == parear_referencia(produtos_ped, produtos_xml, limiar)
+
+def test_limiar_exato_entra():
+    produtos_ped, produtos_xml = ["BANANA PRATA KG"], ["BANANA PRATA CX", "BANANA NANICA KG"]
+    for score in {fuzz.token_sort_ratio(produtos_ped[0], p) for p in produtos_xml}:
+        assert MotorFuzzy(score, workers=1).parear(produtos_ped, produtos_xml) == parear_referencia(produtos_ped, produtos_xml, score)
+
+def test_empate_preserva_ordem_pedido_nota():
+    produtos = ["TOMATE KG", "KG TOMATE"]
+    assert MotorFuzzy(85, workers=1).parear(produtos, list(produtos)) == [(100.0, 0, 0), (100.0, 1, 1)]
@@ -0,0 +1,75 @@
+import random
+
+import pytest
+
+from normalizacao import normalizar, normalizar_serie, estatisticas_normalizar, AutomatoAhoCorasick, ResolvedorFornecedor, ResolvedorLoja
+
+def traduzir_fornecedor(nome_bruto, mapping_forn):
+    """Laço original: primeiro padrão (ORDER BY prioridade DESC) contido no nome."""
+    nome = normalizar(nome_bruto)
+    for original, macro in mapping_forn.items():
+        if original in nome: return macro
+    return nome.replace("FORNECEDOR", "").strip()
+
+def descobrir_loja(cnpj_dest, nome_dest, mapping_nome, mapping_cnpj):
+    """Laço original: sufixos de CNPJ na ordem do cadastro, depois os nomes."""
+    nome = normalizar(nome_dest)
+    cnpj = ''.join(filter(str.isdigit, str(cnpj_dest)))
+    for padrao, loja in mapping_cnpj:
+        if cnpj.endswith(padrao): return loja
+    for padrao, loja in mapping_nome:
+        if padrao in nome: return loja
+    return 'Loja_Desconhecida'
+
+def test_normalizar_serie_calcula_cada_valor_distinto_uma_vez():
+    antes = estatisticas_normalizar()
+    serie = normalizar_serie(["Maçã Gala ", "Maçã Gala ", None, "Maçã Gala ", "ZZ teste único 7361"])
+    depois = estatisticas_normalizar()
+    assert serie.tolist() == ["MACA GALA", "MACA GALA", "", "MACA GALA", "ZZ TESTE UNICO 7361"]
+    assert depois["hits"] + depois["misses"] - antes["hits"] - antes["misses"] == 2
+
+def _textos(rng, alfabeto, n, tamanho):
+    # Alfabeto curto: padrões sobrepostos, aninhados e repetidos aparecem o tempo todo
+    return ["".join(rng.choice(alfabeto) for _ in range(rng.randint(0, tamanho))) for _ in range(n)]
+
+def test_automato_devolve_o_padrao_de_maior_prioridade():
+    automato = AutomatoAhoCorasick(["BANANA PRATA", "ANA", "BANANA", "NAN"])
+    assert automato.melhor("BANANA PRATA KG") == 0
+    assert automato.melhor("BANANA NANICA") == 1  # "ANA" aninhado em "BANANA" e de maior prioridade
+    assert automato.melhor("NANICA") == 3
+    assert automato.melhor("TOMATE") is None
+
+def test_automato_padrao_vazio_casa_com_qualquer_texto():
+    assert AutomatoAhoCorasick(["XYZ", ""]).melhor("TOMATE") == 1
+    assert AutomatoAhoCorasick(["XYZ", ""]).melhor("") == 1
+    assert AutomatoAhoCorasick([" ", "XYZ"]).melhor("XYZ") == 1
+
+@pytest.mark.parametrize("semente", range(30))
+def test_resolvedor_fornecedor_igual_ao_laco(semente):
+    rng = random.Random(semente)
+    padroes = _textos(rng, "ABN ", rng.randint(0, 12), 4)
+    mapping_forn = {padrao.upper().strip(): f"MACRO_{pos}" for pos, padrao in enumerate(padroes)}
+    resolvedor = ResolvedorFornecedor(mapping_forn)
+    for nome in _textos(rng, "ABNá -", 60, 14) + [None, float("nan"), "FORNECEDOR ABN"]:
+        assert resolvedor.resolver(nome) == traduzir_fornecedor(nome, mapping_forn), (mapping_forn, nome)
+        assert resolvedor.resolver(nome) == traduzir_fornecedor(nome, mapping_forn)  # memo
+
+@pytest.mark.parametrize("semente", range(30))
+def test_resolvedor_loja_igual_ao_laco(semente):
+    rng = random.Random(semente)
+    mapping_nome = [(padrao.upper(), f"Loja_N{pos}") for pos, padrao in enumerate(_textos(rng, "LOJA ", rng.randint(0, 8), 4))]
+    mapping_cnpj = [(padrao, f"Loja_C{pos}") for pos, padrao in enumerate(_textos(rng, "0123", rng.randint(0, 8), 4))]
+    resolvedor = ResolvedorLoja(mapping_nome, mapping_cnpj)
+    cnpjs = _textos(rng, "0123./-", 40, 10) + [None, 12301.0]
+    nomes = _textos(rng, "LOJA ó", 40, 12) + [None, ""]
+    for cnpj, nome in zip(cnpjs, nomes):
+        assert resolvedor.resolver(cnpj, nome) == descobrir_loja(cnpj, nome, mapping_nome, mapping_cnpj), (mapping_nome, mapping_cnpj, cnpj, nome)
+
+def test_sufixo_de_cnpj_vence_o_nome_e_segue_a_prioridade():
+    mapping_nome = [("CENTRO", "Loja_Nome")]
+    mapping_cnpj = [("000199", "Loja_Longo"), ("99", "Loja_Curto"), ("0199", "Loja_Repetido"), ("99", "Loja_Duplicado")]
+    resolvedor = ResolvedorLoja(mapping_nome, mapping_cnpj)
+    assert resolvedor.resolver("12.345.678/0001-99", "SUPERMERCADO CENTRO") == "Loja_Longo"
+    assert resolvedor.resolver("12.345.678/0002-99", "SUPERMERCADO CENTRO") == "Loja_Curto"
+    assert resolvedor.resolver("12.345.678/0002-98", "Supermercado Centro") == "Loja_Nome"
+    assert resolvedor.resolver("", "OUTRA") == "Loja_Desconhecida"